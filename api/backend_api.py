@@ -2,8 +2,15 @@
 import os
 import subprocess
 import base64
+import hashlib
 import json
 import shutil
+import threading
+import queue
+import atexit
+import operator
+import logging
+import logging.handlers
 from typing import List, Dict, Any
 import webview
 
@@ -17,34 +24,67 @@ from indexing.image_indexer import index_images as do_image_indexing
 from indexing.text_indexer import index_documents as do_text_indexing
 from search.image_search import search_images, is_embeddings_loaded, force_load_embeddings
 from search.text_search import search_text_content
-from utils.helpers import clean_query, get_value
-from config import UI_DIR, WINDOW_WIDTH, WINDOW_HEIGHT, WINDOW_HEIGHT_EXPANDED, DEFAULT_SEARCH_LIMIT, MAX_IMAGE_SEARCH_RESULTS, INDEXED_PATHS_JSON
+from utils.helpers import clean_query, json_dumps, write_json_atomic
+from config import UI_DIR, WINDOW_WIDTH, WINDOW_HEIGHT, WINDOW_HEIGHT_EXPANDED, DEFAULT_SEARCH_LIMIT, MAX_IMAGE_SEARCH_RESULTS, INDEXED_PATHS_JSON, LOG_FILE, LOG_LEVEL
+
+log = logging.getLogger(__name__)
+
+# Background listener that drains queued log records to disk (started once)
+_log_listener = None
+
+
+def _setup_logging() -> None:
+    """Route log records through a queue so the search path never blocks on file I/O."""
+    global _log_listener
+    if _log_listener is not None:
+        return
+
+    log_queue = queue.Queue(-1)
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    file_handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(LOG_LEVEL)
+
+    _log_listener = logging.handlers.QueueListener(log_queue, file_handler)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+
+# Fetches all serialized FileData fields in a single C-level call
+_FD_GET = operator.attrgetter("file_name", "file_path", "file_type", "length")
 
 
 def _file_to_dict(fd: FileData) -> Dict[str, Any]:
     """Convert FileData to JSON-serializable dict."""
-    return {
-        "name": getattr(fd, "file_name", ""),
-        "path": getattr(fd, "file_path", ""),
-        "type": getattr(fd, "file_type", "unknown"),
-        "length": getattr(fd, "length", 0),
-    }
+    name, path, file_type, length = _FD_GET(fd)
+    return {"name": name, "path": path, "type": file_type, "length": length}
 
 
 class SearchAPI:
     """Main API class for search operations"""
     
     def __init__(self):
+        _setup_logging()
         self._base = os.getcwd()
         self._main_window = None
         self._settings_window = None
         self._info_window = None
+        # Cleared by the windows' closed events so a destroyed handle is never reused
+        self._settings_alive = False
+        self._info_alive = False
         self._visible = True
         # Path to persistent settings file
         self._settings_path = os.path.join(self._base, 'data', 'settings.json')
 
         # Load persisted settings (auto-index flag)
         self._auto_index_enabled = False
+        self._auto_index_pending = False
+        self._auto_index_error = None
+        # Guards _auto_index_pending, set_auto_index may be called from several pywebview threads
+        self._auto_index_lock = threading.Lock()
         self._load_settings()
 
         # If auto-index was enabled previously, attempt to start the watcher executable
@@ -73,22 +113,36 @@ class SearchAPI:
         self._main_window = window
 
     # Search methods
-    def search(self, query: str, search_type: str = 'normal', category: str = None, limit: int = None) -> List[Dict[str, Any]]:
-        """Main search entry point"""
-        print(f"Search API: query='{query}', type='{search_type}', category='{category}', limit={limit}")
+    def search(self, query: str, search_type: str = 'normal', category: str = None, limit: int = None, last_digest: str = None) -> Dict[str, Any]:
+        """Main search entry point.
+        Returns {"results": [...], "digest": str}. When the caller passes the digest of
+        the results it last rendered and they are identical, returns {"unchanged": True}
+        instead so the UI can reuse its own copy (ETag-style; no state is kept here,
+        so concurrent searches cannot clobber each other).
+        """
+        log.debug("Search API: query=%r, type=%r, category=%r, limit=%s", query, search_type, category, limit)
         
         # Use default limit if not specified
         if limit is None:
             limit = DEFAULT_SEARCH_LIMIT
         
         if search_type == 'normal':
-            return self._file_search(query, category, limit)
+            results = self._file_search(query, category, limit)
         elif search_type == 'image':
-            return self._image_search(query, limit)
+            results = self._image_search(query, limit)
         elif search_type == 'text':
-            return self._text_search(query, limit)
+            results = self._text_search(query, limit)
         else:
-            return self._file_search(query, category, limit)
+            results = self._file_search(query, category, limit)
+
+        if not results:
+            return {"results": results, "digest": None}
+
+        # Each search type builds its dicts with a fixed key order, so no sort_keys is needed for a stable digest
+        digest = hashlib.blake2b(json_dumps(results).encode(), digest_size=8).hexdigest()
+        if last_digest is not None and last_digest == digest:
+            return {"unchanged": True, "digest": digest}
+        return {"results": results, "digest": digest}
 
     def _file_search(self, query: str, category: str = None, limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict[str, Any]]:
         """Normal file/folder search"""
@@ -109,10 +163,10 @@ class SearchAPI:
         try:
             categories = [category] if category else None
             matches = search_db(q, limit=limit, categories=categories)
-            print(f"Found {len(matches)} matches")
-            return [_file_to_dict(m) for m in (matches or [])]
+            log.debug("Found %d matches", len(matches))
+            return list(map(_file_to_dict, matches or []))
         except Exception as e:
-            print(f"File search error: {e}")
+            log.warning("File search error: %s", e)
             return []
 
     def _image_search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict[str, Any]]:
@@ -147,12 +201,12 @@ class SearchAPI:
                         "image_url": f"data:{mime_type};base64,{encoded}"
                     })
                 except Exception as e:
-                    print(f"Error loading image {p}: {e}")
+                    log.warning("Error loading image %s: %s", p, e)
                     continue
             
             return processed_results
         except Exception as e:
-            print(f"Image search error: {e}")
+            log.warning("Image search error: %s", e)
             return []
 
     def _text_search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict[str, Any]]:
@@ -163,7 +217,7 @@ class SearchAPI:
             results = search_text_content(query)
             return results[:limit] if limit else results
         except Exception as e:
-            print(f"Text search error: {e}")
+            log.warning("Text search error: %s", e)
             return []
 
     # Indexing methods
@@ -208,14 +262,13 @@ class SearchAPI:
                 data = {'image_paths': [], 'document_paths': []}
             
             # Update with new paths (merge, avoiding duplicates)
-            existing_paths = set(data.get(key, []))
-            new_paths = existing_paths.union(set(paths))
+            # normcase so 'C:\Users\x' and 'c:\users\x' dedupe to one entry on Windows
+            existing_paths = {os.path.normcase(os.path.normpath(p)) for p in data.get(key, [])}
+            new_paths = existing_paths.union(os.path.normcase(os.path.normpath(p)) for p in paths)
             data[key] = list(new_paths)
             
             # Save back
-            os.makedirs(os.path.dirname(INDEXED_PATHS_JSON), exist_ok=True)
-            with open(INDEXED_PATHS_JSON, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2)
+            write_json_atomic(INDEXED_PATHS_JSON, data, indent=2)
             
             print(f"Saved {len(data[key])} {key} to indexed_paths.json")
         except Exception as e:
@@ -267,6 +320,7 @@ class SearchAPI:
             os.path.join(base_path, 'OneDrive', 'Documents'),
             os.path.join(base_path, 'Desktop')
         ]
+        paths = [os.path.normcase(os.path.normpath(p)) for p in paths]
         
         # Only return paths that exist
         return [p for p in paths if os.path.exists(p)]
@@ -282,6 +336,7 @@ class SearchAPI:
             os.path.join(base_path, 'Desktop'),
             os.path.join(base_path, 'OneDrive', 'Documents'),
         ]
+        paths = [os.path.normcase(os.path.normpath(p)) for p in paths]
         
         # Only return paths that exist
         return [p for p in paths if os.path.exists(p)]
@@ -371,13 +426,10 @@ class SearchAPI:
     def open_settings(self) -> str:
         """Open settings window"""
         try:
-            # Always destroy and recreate to ensure fresh state
-            if self._settings_window is not None:
-                try:
-                    self._settings_window.destroy()
-                except:
-                    pass
-                self._settings_window = None
+            # Reuse the existing window, creating a webview is expensive
+            if self._settings_window is not None and self._settings_alive:
+                self._settings_window.show()
+                return "ok"
             
             self._settings_window = webview.create_window(
                 "Settings", os.path.join(UI_DIR, "settings.html"),
@@ -385,6 +437,8 @@ class SearchAPI:
                 frameless=True, on_top=True,
                 background_color="#9494EE"
             )
+            self._settings_alive = True
+            self._settings_window.events.closed += lambda: setattr(self, '_settings_alive', False)
             # Expose methods
             self._settings_window.expose(self.index_files)
             self._settings_window.expose(self.index_documents)
@@ -405,13 +459,10 @@ class SearchAPI:
     def open_info(self) -> str:
         """Open info window"""
         try:
-            # Always destroy and recreate to ensure fresh state
-            if self._info_window is not None:
-                try:
-                    self._info_window.destroy()
-                except:
-                    pass
-                self._info_window = None
+            # Reuse the existing window, creating a webview is expensive
+            if self._info_window is not None and self._info_alive:
+                self._info_window.show()
+                return "ok"
             
             self._info_window = webview.create_window(
                 "Information", os.path.join(UI_DIR, "info.html"),
@@ -419,6 +470,8 @@ class SearchAPI:
                 frameless=True, on_top=True,
                 background_color="#9494EE"
             )
+            self._info_alive = True
+            self._info_window.events.closed += lambda: setattr(self, '_info_alive', False)
             self._info_window.expose(self.back_to_search_from_info)
             
             return "ok"
@@ -429,10 +482,9 @@ class SearchAPI:
         """Return to main search window from settings"""
         try:
             print("back_to_search_from_settings called")
-            if self._settings_window:
-                print("Destroying settings window")
-                self._settings_window.destroy()
-                self._settings_window = None
+            if self._settings_window and self._settings_alive:
+                print("Hiding settings window")
+                self._settings_window.hide()
             if self._main_window:
                 print("Showing main window")
                 self._main_window.show()
@@ -447,10 +499,9 @@ class SearchAPI:
         """Return to main search window from info"""
         try:
             print("back_to_search_from_info called")
-            if self._info_window:
-                print("Destroying info window")
-                self._info_window.destroy()
-                self._info_window = None
+            if self._info_window and self._info_alive:
+                print("Hiding info window")
+                self._info_window.hide()
             if self._main_window:
                 print("Showing main window")
                 self._main_window.show()
@@ -465,14 +516,12 @@ class SearchAPI:
         """Return to main search window"""
         try:
             print("back_to_search called")  # Debug log
-            if self._settings_window:
-                print("Destroying settings window")
-                self._settings_window.destroy()
-                self._settings_window = None  # Reset so it gets recreated next time
-            if self._info_window:
-                print("Destroying info window")
-                self._info_window.destroy()
-                self._info_window = None
+            if self._settings_window and self._settings_alive:
+                print("Hiding settings window")
+                self._settings_window.hide()  # Kept alive so reopening is instant
+            if self._info_window and self._info_alive:
+                print("Hiding info window")
+                self._info_window.hide()
             if self._main_window:
                 print("Showing main window")
                 self._main_window.show()
@@ -500,53 +549,35 @@ class SearchAPI:
             startup_exe_path = os.path.join(startup_folder, watcher_exe_name)
             
             if enabled:
-                # Step 1: Check if .exe already exists (from previous build)
-                watcher_exe = os.path.join(scripts_dir, "bin", "Release", "net6.0", "win-x64", "publish", watcher_exe_name)
-                
-                if not os.path.exists(watcher_exe):
-                    # Step 2: Build the C# project
-                    print("Building file watcher executable...")
-                    build_result = self._build_watcher(scripts_dir)
-                    
-                    if not build_result["success"]:
+                # Build/copy/start can take seconds, run it off the UI thread and let the UI poll
+                with self._auto_index_lock:
+                    if self._auto_index_pending:
                         return {
-                            "status": "error",
-                            "message": f"Failed to build watcher: {build_result.get('error', 'Unknown error')}",
-                            "enabled": False
+                            "status": "pending",
+                            "message": "Auto-indexing setup already in progress...",
+                            "enabled": True
                         }
-                    
-                    watcher_exe = build_result["exe_path"]
-                
-                # Step 3: Copy to startup folder
-                print(f"Copying watcher to startup folder: {startup_folder}")
-                shutil.copy(watcher_exe, startup_exe_path)
-                
-                # Step 3b: Copy auto_index.py to startup folder (so watcher can find it)
-                auto_index_py = os.path.join(base_dir, "auto_index.py")
-                startup_auto_index_path = os.path.join(startup_folder, "auto_index.py")
-                
-                if os.path.exists(auto_index_py):
-                    print(f"Copying auto_index.py to startup folder")
-                    shutil.copy(auto_index_py, startup_auto_index_path)
-                else:
-                    print(f"WARNING: auto_index.py not found at {auto_index_py}")
-                
-                # Step 4: Start the watcher now
-                print("Starting file watcher...")
-                subprocess.Popen([startup_exe_path], creationflags=subprocess.CREATE_NO_WINDOW)
-
-                # Persist setting
-                self._auto_index_enabled = True
-                try:
-                    self._save_settings()
-                except Exception:
-                    pass
+                    self._auto_index_pending = True
+                    self._auto_index_error = None
+                threading.Thread(
+                    target=self._install_watcher,
+                    args=(base_dir, scripts_dir, startup_folder, startup_exe_path, watcher_exe_name),
+                    daemon=True
+                ).start()
                 return {
-                    "status": "success",
-                    "message": "Auto-indexing enabled. File watcher is now running.",
+                    "status": "pending",
+                    "message": "Setting up auto-indexing...",
                     "enabled": True
                 }
             else:
+                # The setup thread would copy and start the watcher after we removed it, so refuse until it finishes
+                with self._auto_index_lock:
+                    if self._auto_index_pending:
+                        return {
+                            "status": "error",
+                            "message": "Auto-indexing setup is still in progress, try again when it finishes.",
+                            "enabled": True
+                        }
                 # Disable: Remove from startup and kill process
                 if os.path.exists(startup_exe_path):
                     os.remove(startup_exe_path)
@@ -556,12 +587,13 @@ class SearchAPI:
                 if os.path.exists(startup_auto_index_path):
                     os.remove(startup_auto_index_path)
                 
-                # Kill any running watcher processes
+                # Kill any running watcher processes (fire-and-forget, the result is ignored anyway)
                 try:
-                    subprocess.run(
+                    subprocess.Popen(
                         ['taskkill', '/F', '/IM', watcher_exe_name],
-                        capture_output=True,
-                        creationflags=subprocess.CREATE_NO_WINDOW
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL,
+                        creationflags=subprocess.CREATE_NO_WINDOW | subprocess.DETACHED_PROCESS
                     )
                 except:
                     pass  # Ignore if process not running
@@ -585,6 +617,55 @@ class SearchAPI:
                 "enabled": False
             }
     
+    def _install_watcher(self, base_dir: str, scripts_dir: str, startup_folder: str,
+                         startup_exe_path: str, watcher_exe_name: str) -> None:
+        """Build (if needed), copy and start the watcher. Runs on a background thread."""
+        try:
+            # Step 1: Check if .exe already exists (from previous build)
+            watcher_exe = os.path.join(scripts_dir, "bin", "Release", "net6.0", "win-x64", "publish", watcher_exe_name)
+            
+            if not os.path.exists(watcher_exe):
+                # Step 2: Build the C# project
+                print("Building file watcher executable...")
+                build_result = self._build_watcher(scripts_dir)
+                
+                if not build_result["success"]:
+                    self._auto_index_error = f"Failed to build watcher: {build_result.get('error', 'Unknown error')}"
+                    return
+                
+                watcher_exe = build_result["exe_path"]
+            
+            # Step 3: Copy to startup folder
+            print(f"Copying watcher to startup folder: {startup_folder}")
+            shutil.copy(watcher_exe, startup_exe_path)
+            
+            # Step 3b: Copy auto_index.py to startup folder (so watcher can find it)
+            auto_index_py = os.path.join(base_dir, "auto_index.py")
+            startup_auto_index_path = os.path.join(startup_folder, "auto_index.py")
+            
+            if os.path.exists(auto_index_py):
+                print(f"Copying auto_index.py to startup folder")
+                shutil.copy(auto_index_py, startup_auto_index_path)
+            else:
+                print(f"WARNING: auto_index.py not found at {auto_index_py}")
+            
+            # Step 4: Start the watcher now
+            print("Starting file watcher...")
+            subprocess.Popen([startup_exe_path], creationflags=subprocess.CREATE_NO_WINDOW)
+
+            # Persist setting
+            self._auto_index_enabled = True
+            try:
+                self._save_settings()
+            except Exception:
+                pass
+        except Exception as e:
+            print(f"Error enabling auto-index: {e}")
+            self._auto_index_error = str(e)
+        finally:
+            with self._auto_index_lock:
+                self._auto_index_pending = False
+
     def _build_watcher(self, scripts_dir: str) -> Dict[str, Any]:
         """Build the C# file watcher executable"""
         try:
@@ -641,8 +722,12 @@ class SearchAPI:
             }
 
     def get_auto_index_state(self) -> Dict[str, Any]:
-        """Get auto-index state"""
-        return {"enabled": self._auto_index_enabled}
+        """Get auto-index state, including progress of a pending enable request"""
+        return {
+            "enabled": self._auto_index_enabled,
+            "pending": self._auto_index_pending,
+            "error": self._auto_index_error
+        }
 
     def _load_settings(self) -> None:
         """Load persistent settings from disk (if present)."""
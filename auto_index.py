@@ -1,21 +1,27 @@
 """
 Auto-indexing script for individual files/folders
 Handles adding/updating entries in file search, image, and text databases
-Usage: python auto_index.py <file_path>
+Usage: python auto_index.py <file_path> [<file_path> ...]
 """
 import os
 import sys
 import json
+import re
 import string
+import hashlib
+import queue
 import sqlite3
+import threading
 import numpy as np
 from typing import Optional
+from functools import lru_cache
 
 # Image processing imports
 try:
     import torch
+    import torch.nn.functional as F
     import clip
-    from PIL import Image
+    from utils.image_preprocess import preprocess_on_device
     CLIP_AVAILABLE = True
 except ImportError:
     CLIP_AVAILABLE = False
@@ -31,29 +37,118 @@ except ImportError:
     TEXT_MODELS_AVAILABLE = False
     print("Warning: Text processing libraries not available. Document indexing will be skipped.")
 
+# Optional PyMuPDF for PDFs (C extraction, several times faster than PyPDF2)
+try:
+    import fitz
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+
+# Optional ONNX Runtime backend for the text encoder (int8, much faster on CPU)
+try:
+    import onnxruntime as ort
+    from transformers import AutoTokenizer
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
 from models.data_models import FileData
 from config import (
     FILE_SEARCH_DB, IMAGE_EMBEDDINGS_DB, TEXT_EMBEDDINGS_DB, FILE_DATA_JSON,
     VALID_IMAGE_EXTENSIONS, VALID_DOCUMENT_EXTENSIONS, VALID_SYMBOLS,
-    SKIP_FOLDERS, SKIP_FILES, SKIP_PATTERNS, MIN_IMAGE_SIZE_KB, TEXT_SEARCH_MODEL,
-    INDEXED_PATHS_JSON
+    SKIP_FOLDERS, SKIP_FILES, MIN_IMAGE_SIZE_KB, TEXT_SEARCH_MODEL,
+    INDEXED_PATHS_JSON, TEXT_ONNX_DIR, USE_ONNX_TEXT_MODEL,
+    CONTENT_HASH_MAX_BYTES, BATCH_SIZE, FILE_DATA_JOURNAL, FILE_DATA_JOURNAL_MAX_BYTES
 )
-from utils.helpers import is_hidden, is_accessible, get_value
+from utils.db import ensure_file_search_schema
+from utils.helpers import is_hidden, is_accessible, has_skip_pattern, name_to_key, json_dumps, json_loads, write_json_atomic, quantize_embedding
+
+
+class OnnxTextEncoder:
+    """
+    Int8-quantized ONNX export of the sentence-transformer text model.
+    Mirrors the subset of SentenceTransformer.encode used here: mean pooling + L2 normalize.
+    """
+    
+    MODEL_FILE = "model_quantized.onnx"
+    
+    def __init__(self, model_dir: str):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, self.MODEL_FILE), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+    
+    @classmethod
+    def export(cls, model_name: str, model_dir: str) -> None:
+        """Export model_name to ONNX and quantize its weights to int8 (one-time, slow)"""
+        print(f"Exporting {model_name} to quantized ONNX (first run only)...")
+        export_dir = model_dir + "_fp32"
+        ort_model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+        ort_model.save_pretrained(export_dir)
+        quantizer = ORTQuantizer.from_pretrained(export_dir)
+        qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=model_dir, quantization_config=qconfig)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(model_dir)
+    
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = True, **kwargs) -> np.ndarray:
+        """Embed a list of strings, returning a float32 array of shape [len(sentences), dim]"""
+        outputs = []
+        for start in range(0, len(sentences), batch_size):
+            tokens = self.tokenizer(
+                sentences[start:start + batch_size], padding=True, truncation=True,
+                max_length=512, return_tensors="np"
+            )
+            feed = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+            hidden = self.session.run(None, feed)[0]
+            
+            # Mean pooling over non-padding tokens
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                pooled /= np.linalg.norm(pooled, axis=1, keepdims=True)
+            outputs.append(pooled.astype(np.float32))
+        return np.vstack(outputs)
+
+
+def load_text_model():
+    """Load the quantized ONNX text encoder when possible, else the PyTorch SentenceTransformer"""
+    if ONNX_AVAILABLE and USE_ONNX_TEXT_MODEL:
+        try:
+            if not os.path.exists(os.path.join(TEXT_ONNX_DIR, OnnxTextEncoder.MODEL_FILE)):
+                OnnxTextEncoder.export(TEXT_SEARCH_MODEL, TEXT_ONNX_DIR)
+            return OnnxTextEncoder(TEXT_ONNX_DIR)
+        except Exception as e:
+            print(f"Warning: ONNX text model unavailable, falling back to PyTorch: {e}")
+    return SentenceTransformer(TEXT_SEARCH_MODEL, device="cuda" if torch.cuda.is_available() else "cpu")
 
 
 # Initialize models globally
 if CLIP_AVAILABLE:
     device = "cuda" if torch.cuda.is_available() else "cpu"
     clip_model, preprocess = clip.load("ViT-B/32", device=device)
+    clip_model = clip_model.eval().half() if device == "cuda" else clip_model.eval()  # fp16 on Tensor Cores
 
 if TEXT_MODELS_AVAILABLE:
-    text_model = SentenceTransformer(TEXT_SEARCH_MODEL)
+    import torch
+    if not torch.cuda.is_available():
+        # Use every core for CPU inference, the default leaves some idle
+        torch.set_num_threads(os.cpu_count() or 1)
+    text_model = load_text_model()
+
+
+# Allowed filename characters, and a translate table that deletes them
+_ALLOWED = frozenset(string.ascii_letters + string.digits) | VALID_SYMBOLS
+_DELETE_ALLOWED = str.maketrans('', '', ''.join(_ALLOWED))
 
 
 def has_valid_characters(filename: str) -> bool:
-    """Check if filename contains only valid characters"""
-    ALLOWED = set(string.ascii_letters + string.digits).union(VALID_SYMBOLS)
-    return all(ch in ALLOWED for ch in filename)
+    """Check if filename contains only valid characters (nothing is left once they're deleted)"""
+    return not filename.translate(_DELETE_ALLOWED)
 
 
 def should_skip(path: str) -> bool:
@@ -70,7 +165,7 @@ def should_skip(path: str) -> bool:
         return True
     
     # Check skip patterns
-    if any(pattern in basename_lower for pattern in SKIP_PATTERNS):
+    if has_skip_pattern(basename_lower):
         return True
     
     # Check if hidden or inaccessible
@@ -93,91 +188,119 @@ def get_indexed_paths() -> dict:
         return {'image_paths': [], 'document_paths': []}
 
 
+@lru_cache(maxsize=8)
+def _indexed_prefixes(indexed_paths: tuple) -> tuple:
+    """Normalized indexed paths, each ending in a separator, for plain startswith checks"""
+    return tuple(
+        os.path.normcase(os.path.abspath(p)).rstrip(os.sep) + os.sep
+        for p in indexed_paths
+    )
+
+
 def is_path_in_indexed_paths(file_path: str, indexed_paths: list) -> bool:
-    """Check if file_path is within any of the indexed paths"""
-    file_path = os.path.abspath(file_path)
-    
-    for indexed_path in indexed_paths:
-        indexed_path = os.path.abspath(indexed_path)
-        
-        # Check if file is within this indexed path
-        try:
-            # Use os.path.commonpath to check if they share a common root
-            common = os.path.commonpath([file_path, indexed_path])
-            # If the common path equals the indexed path, file is within it
-            if os.path.normcase(common) == os.path.normcase(indexed_path):
-                return True
-        except ValueError:
-            # Different drives on Windows
-            continue
+    """Check if file_path is within (or equal to) any of the indexed paths"""
+    prefixes = _indexed_prefixes(tuple(indexed_paths))
+    if not prefixes:
+        return False
     
-    return False
+    # Paths on a different drive simply don't share the prefix
+    file_path = os.path.normcase(os.path.abspath(file_path)).rstrip(os.sep) + os.sep
+    return file_path.startswith(prefixes)
+
+
+_CATEGORY_BY_TYPE = {
+    'folder': 'folder',
+    **dict.fromkeys(["png", "jpg", "jpeg", "gif", "bmp", "webp", "tiff"], 'image'),
+    **dict.fromkeys(["mp4", "mkv", "mov", "avi", "wmv", "flv", "webm"], 'video'),
+    **dict.fromkeys(["mp3", "wav", "flac", "m4a", "aac", "ogg"], 'audio'),
+    **dict.fromkeys(["zip", "7z", "rar", "tar", "gz"], 'archive'),
+    **dict.fromkeys(["pdf", "ppt", "pptx", "xls", "xlsx", "csv", "md", "txt", "rtf", "doc", "docx"], 'document'),
+}
 
 
 def get_file_category(file_type: str) -> str:
     """Determine file category based on file type/extension"""
     if not file_type:
         return 'file'
-    
-    t = file_type.lower()
-    
-    if t == 'folder':
-        return 'folder'
-    if t in ["png", "jpg", "jpeg", "gif", "bmp", "webp", "tiff"]:
-        return 'image'
-    if t in ["mp4", "mkv", "mov", "avi", "wmv", "flv", "webm"]:
-        return 'video'
-    if t in ["mp3", "wav", "flac", "m4a", "aac", "ogg"]:
-        return 'audio'
-    if t in ["zip", "7z", "rar", "tar", "gz"]:
-        return 'archive'
-    if t in ["pdf", "ppt", "pptx", "xls", "xlsx", "csv", "md", "txt", "rtf", "doc", "docx"]:
-        return 'document'
-    
-    return 'file'
+    return _CATEGORY_BY_TYPE.get(file_type.lower(), 'file')
 
 
-def index_to_file_search_db(file_data: FileData) -> bool:
+class FileSearchWriter:
     """
-    Add or update file entry in the file search database.
-    Returns True if successful.
+    Buffers file search rows and writes them with one executemany per batch.
+    Keeps a single WAL connection open, so indexing many paths costs one commit per BATCH_SIZE rows.
     """
-    try:
+
+    def __init__(self, db_path: str = FILE_SEARCH_DB, batch_size: int = BATCH_SIZE):
+        self.batch_size = batch_size
+        self.pending = []  # (prefix, file_extension, file_category, file_name, file_path, file_type) rows
+        # A full rebuild commits in batches; wait out its current batch instead of failing with "database is locked"
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA cache_size=-65536")  # 64 MB
+        ensure_file_search_schema(self.conn)
+
+    def add(self, file_data: FileData) -> bool:
+        """Queue a file for insertion. Returns False if the name can't be indexed."""
         # Validate filename
         if not has_valid_characters(file_data.file_name):
             print(f"Skipping '{file_data.file_name}' - contains invalid characters")
             return False
         
         # Normalize filename to create prefix key
-        normalized_name = file_data.file_name.lower()
-        prefix_chars = []
-        for char in normalized_name:
-            prefix_chars.append(get_value(char))
-        normalized_key = ''.join(prefix_chars)
+        normalized_key = name_to_key(file_data.file_name)
         
         # Get file extension and category
         file_extension = file_data.file_type.lower() if file_data.file_type else 'unknown'
         file_category = get_file_category(file_data.file_type)
         
-        # Convert FileData to JSON
-        file_json = json.dumps(file_data.to_dict())
-        
-        # Connect to database
-        conn = sqlite3.connect(FILE_SEARCH_DB)
-        cursor = conn.cursor()
-        
-        # Try to insert, or append if exists
-        cursor.execute("""
-            INSERT INTO file_index (prefix, file_extension, file_category, files_json)
-            VALUES (?, ?, ?, json_array(?))
-            ON CONFLICT(prefix) DO UPDATE SET
-                files_json = json_insert(files_json, '$[#]', json(?))
-        """, (normalized_key, file_extension, file_category, file_json, file_json))
-        
-        conn.commit()
-        conn.close()
+        self.pending.append((normalized_key, file_extension, file_category,
+                             file_data.file_name, file_data.file_path, file_data.file_type))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self) -> None:
+        """Write the buffered rows in a single transaction"""
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO files (prefix, file_extension, file_category, file_name, file_path, file_type)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, self.pending)
+        self.pending.clear()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def index_to_file_search_db(file_data: FileData, writer: Optional[FileSearchWriter] = None) -> bool:
+    """
+    Add or update file entry in the file search database.
+    With a writer the row is buffered and written on its next flush, otherwise it is written immediately.
+    Returns True if successful.
+    """
+    try:
+        if writer is None:
+            with FileSearchWriter() as own_writer:
+                added = own_writer.add(file_data)
+        else:
+            added = writer.add(file_data)
+        if not added:
+            return False
         
-        print(f"✓ Indexed to file search DB: {file_data.file_name} [{file_category}]")
+        print(f"✓ Indexed to file search DB: {file_data.file_name} [{get_file_category(file_data.file_type)}]")
         return True
         
     except Exception as e:
@@ -188,31 +311,18 @@ def index_to_file_search_db(file_data: FileData) -> bool:
 def index_to_file_data_json(file_path: str) -> bool:
     """
     Add or update image file entry in file_data.json.
+    The entry is appended to a JSONL journal; the JSON file is only rewritten when the journal is compacted.
     Returns True if successful.
     """
     try:
-        # Load existing data
-        if os.path.exists(FILE_DATA_JSON):
-            with open(FILE_DATA_JSON, 'r', encoding='utf-8') as f:
-                try:
-                    data = json.load(f)
-                except json.JSONDecodeError:
-                    data = {}
-        else:
-            data = {}
-        
-        # Add or update entry
-        data[file_path] = {
-            'path': file_path,
-            'indexed': True
-        }
+        os.makedirs(os.path.dirname(FILE_DATA_JOURNAL), exist_ok=True)
+        with open(FILE_DATA_JOURNAL, 'a', encoding='utf-8') as f:
+            f.write(json_dumps({'path': file_path, 'indexed': True}) + '\n')
         
-        # Save back to file
-        os.makedirs(os.path.dirname(FILE_DATA_JSON), exist_ok=True)
-        with open(FILE_DATA_JSON, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
+        if os.path.getsize(FILE_DATA_JOURNAL) > FILE_DATA_JOURNAL_MAX_BYTES:
+            compact_file_data_journal()
         
-        print(f"✓ Updated file_data.json")
+        print("✓ Updated file_data.json")
         return True
         
     except Exception as e:
@@ -220,6 +330,59 @@ def index_to_file_data_json(file_path: str) -> bool:
         return False
 
 
+def compact_file_data_journal() -> None:
+    """Fold the journaled entries into file_data.json with an atomic rewrite"""
+    # Claim the journal first; a concurrent auto_index run that loses the rename just keeps appending
+    claimed = FILE_DATA_JOURNAL + ".compacting"
+    try:
+        os.replace(FILE_DATA_JOURNAL, claimed)
+    except FileNotFoundError:
+        return
+    
+    data = {}
+    if os.path.exists(FILE_DATA_JSON):
+        with open(FILE_DATA_JSON, 'r', encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                data = {}
+    
+    with open(claimed, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json_loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from a crashed writer
+            data[entry['path']] = entry
+    
+    write_json_atomic(FILE_DATA_JSON, data, indent=2)
+    os.remove(claimed)
+
+
+def content_hash(file_path: str) -> str:
+    """
+    Fingerprint a file so unchanged files can skip re-encoding.
+    Files above CONTENT_HASH_MAX_BYTES are keyed on mtime + size instead of their bytes.
+    """
+    st = os.stat(file_path)
+    if st.st_size > CONTENT_HASH_MAX_BYTES:
+        return f"stat:{st.st_mtime_ns}:{st.st_size}"
+    
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def ensure_content_hash_column(conn: sqlite3.Connection, key_column: str) -> None:
+    """Add the content_hash column (and its lookup index) to an existing embeddings table"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(embeddings)")}
+    if 'content_hash' not in columns:
+        conn.execute("ALTER TABLE embeddings ADD COLUMN content_hash TEXT")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_embeddings_hash ON embeddings({key_column}, content_hash)")
+
+
 def index_image(file_path: str) -> bool:
     """
     Index an image file: add to file_data.json and generate embeddings.
@@ -239,27 +402,35 @@ def index_image(file_path: str) -> bool:
         # Update file_data.json
         index_to_file_data_json(file_path)
         
+        # Skip the encoder entirely if this exact content is already indexed
+        digest = content_hash(file_path)
+        conn = sqlite3.connect(IMAGE_EMBEDDINGS_DB)
+        ensure_content_hash_column(conn, 'path')
+        if conn.execute("SELECT 1 FROM embeddings WHERE path = ? AND content_hash = ?",
+                        (file_path, digest)).fetchone():
+            conn.close()
+            print("✓ Image unchanged, reusing stored embedding")
+            return True
+        
         # Generate embedding
-        image = preprocess(Image.open(file_path)).unsqueeze(0).to(device)
-        with torch.no_grad():
-            embedding = clip_model.encode_image(image)
-            embedding = embedding / embedding.norm(dim=-1, keepdim=True)  # Normalize
+        image = preprocess_on_device(file_path, preprocess, device).unsqueeze(0)
+        with torch.inference_mode():
+            embedding = F.normalize(clip_model.encode_image(image), dim=-1)
         
-        embedding_array = embedding.cpu().numpy().squeeze().astype(np.float32)
+        embedding_array = embedding.float().cpu().numpy().squeeze()
         
         # Store in database
-        conn = sqlite3.connect(IMAGE_EMBEDDINGS_DB)
         cursor = conn.cursor()
         
         cursor.execute("""
-            INSERT OR REPLACE INTO embeddings (path, embedding)
-            VALUES (?, ?)
-        """, (file_path, embedding_array.tobytes()))
+            INSERT OR REPLACE INTO embeddings (path, embedding, content_hash)
+            VALUES (?, ?, ?)
+        """, (file_path, quantize_embedding(embedding_array), digest))
         
         conn.commit()
         conn.close()
         
-        print(f"✓ Indexed image embeddings")
+        print("✓ Indexed image embeddings")
         return True
         
     except Exception as e:
@@ -273,6 +444,9 @@ def extract_text_from_file(file_path: str) -> Optional[str]:
     
     try:
         if ext == ".pdf":
+            if PYMUPDF_AVAILABLE:
+                with fitz.open(file_path) as doc:
+                    return "\n".join(page.get_text("text") for page in doc)
             reader = PdfReader(file_path)
             text = "\n".join([page.extract_text() or "" for page in reader.pages])
             return text
@@ -296,27 +470,54 @@ def extract_text_from_file(file_path: str) -> Optional[str]:
         return None
 
 
+@lru_cache(maxsize=None)
+def _chunk_pattern(chunk_size: int):
+    """Longest run of whole words under chunk_size chars, or a single over-long word"""
+    return re.compile(r'\S.{0,%d}(?= |$)|\S+' % max(chunk_size - 2, 0))
+
+
 def chunk_text(text: str, chunk_size: int = 500) -> list:
     """Split text into chunks of approximately chunk_size characters"""
-    words = text.split()
-    chunks = []
-    current_chunk = []
-    current_length = 0
-    
-    for word in words:
-        word_length = len(word) + 1  # +1 for space
-        if current_length + word_length > chunk_size and current_chunk:
-            chunks.append(' '.join(current_chunk))
-            current_chunk = [word]
-            current_length = word_length
+    # Collapse whitespace so chunks are words joined by single spaces, then let the regex engine do the packing
+    return _chunk_pattern(chunk_size).findall(' '.join(text.split()))
+
+
+def _write_document_chunks(file_path: str, digest: str, batches: queue.Queue,
+                           aborted: threading.Event, errors: list):
+    """
+    Writer side of index_document: replaces the file's chunks with the batches pushed on the queue,
+    in a single transaction committed when the None sentinel arrives.
+    The connection is opened here because sqlite3 connections can't be shared across threads.
+    """
+    conn = sqlite3.connect(TEXT_EMBEDDINGS_DB)
+    drained = False
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        cursor = conn.cursor()
+        conn.execute("BEGIN")
+        cursor.execute("DELETE FROM embeddings WHERE file_path = ?", (file_path,))
+        while (item := batches.get()) is not None:
+            start, embeddings, batch = item
+            cursor.executemany("""
+                INSERT INTO embeddings (file_path, chunk_index, embedding, content, content_hash)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(file_path, start + i, embedding.astype(np.float16).tobytes(), chunk, digest)
+                  for i, (chunk, embedding) in enumerate(zip(batch, embeddings))])
+        drained = True
+        if aborted.is_set():
+            conn.rollback()
         else:
-            current_chunk.append(word)
-            current_length += word_length
-    
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
-    
-    return chunks
+            conn.commit()
+    except Exception as e:
+        conn.rollback()
+        errors.append(e)
+        # Keep draining so the encoder never blocks on a full queue
+        while not drained and batches.get() is not None:
+            pass
+    finally:
+        conn.close()
 
 
 def index_document(file_path: str) -> bool:
@@ -329,37 +530,55 @@ def index_document(file_path: str) -> bool:
         return False
     
     try:
+        # Skip extraction and encoding if this exact content is already indexed
+        digest = content_hash(file_path)
+        conn = sqlite3.connect(TEXT_EMBEDDINGS_DB)
+        ensure_content_hash_column(conn, 'file_path')
+        unchanged = conn.execute("SELECT 1 FROM embeddings WHERE file_path = ? AND content_hash = ? LIMIT 1",
+                                 (file_path, digest)).fetchone()
+        conn.close()
+        if unchanged:
+            print("✓ Document unchanged, reusing stored embeddings")
+            return True
+        
         # Extract text
         text = extract_text_from_file(file_path)
         if not text or not text.strip():
-            print(f"✗ No text extracted from document")
+            print("✗ No text extracted from document")
             return False
         
         # Split into chunks
         chunks = chunk_text(text, chunk_size=500)
         
         if not chunks:
-            print(f"✗ No text chunks created")
+            print("✗ No text chunks created")
             return False
         
-        # Generate embeddings for each chunk
-        conn = sqlite3.connect(TEXT_EMBEDDINGS_DB)
-        cursor = conn.cursor()
-        
-        # Delete existing entries for this file
-        cursor.execute("DELETE FROM embeddings WHERE file_path = ?", (file_path,))
-        
-        for idx, chunk in enumerate(chunks):
-            embedding = text_model.encode(chunk)
-            embedding_bytes = np.array(embedding, dtype=np.float32).tobytes()
-            
-            cursor.execute("""
-                INSERT INTO embeddings (file_path, chunk_index, embedding, content)
-                VALUES (?, ?, ?, ?)
-            """, (file_path, idx, embedding_bytes, chunk))
-        
-        conn.commit()
-        conn.close()
+        # Encode batches on this thread while a writer thread stores the previous ones
+        batches = queue.Queue(maxsize=4)
+        aborted = threading.Event()
+        writer_errors = []
+        writer = threading.Thread(target=_write_document_chunks,
+                                  args=(file_path, digest, batches, aborted, writer_errors))
+        writer.start()
+        try:
+            for start in range(0, len(chunks), 32):
+                batch = chunks[start:start + 32]
+                embeddings = text_model.encode(
+                    batch, batch_size=32, convert_to_numpy=True,
+                    normalize_embeddings=True, show_progress_bar=False
+                )
+                batches.put((start, embeddings, batch))
+                if writer_errors:
+                    break
+        except Exception:
+            aborted.set()
+            raise
+        finally:
+            batches.put(None)
+            writer.join()
+        if writer_errors:
+            raise writer_errors[0]
         
         print(f"✓ Indexed document with {len(chunks)} chunks")
         return True
@@ -369,12 +588,13 @@ def index_document(file_path: str) -> bool:
         return False
 
 
-def auto_index(file_path: str) -> bool:
+def auto_index(file_path: str, writer: Optional[FileSearchWriter] = None) -> bool:
     """
     Automatically index a file or folder based on its type.
     
     Args:
         file_path: Absolute path to file or folder to index
+        writer: Optional shared FileSearchWriter, used to batch file search inserts across paths
     
     Returns:
         True if indexing was successful
@@ -413,7 +633,7 @@ def auto_index(file_path: str) -> bool:
     file_data = FileData(basename, file_path, file_type)
     
     # Always index to file search database
-    success = index_to_file_search_db(file_data)
+    success = index_to_file_search_db(file_data, writer)
     
     # Load indexed paths for images and documents
     indexed_paths = get_indexed_paths()
@@ -421,21 +641,21 @@ def auto_index(file_path: str) -> bool:
     # If it's an image, check if it's in indexed image paths before indexing embeddings
     if ext in VALID_IMAGE_EXTENSIONS:
         if is_path_in_indexed_paths(file_path, indexed_paths.get('image_paths', [])):
-            print(f"\nDetected image file in indexed path, indexing embeddings...")
+            print("\nDetected image file in indexed path, indexing embeddings...")
             image_success = index_image(file_path)
             success = success and image_success
         else:
-            print(f"\nImage file not in indexed paths, skipping embedding generation")
+            print("\nImage file not in indexed paths, skipping embedding generation")
             print(f"(Image paths: {indexed_paths.get('image_paths', [])})")
     
     # If it's a document, check if it's in indexed document paths before indexing text
     elif ext in VALID_DOCUMENT_EXTENSIONS:
         if is_path_in_indexed_paths(file_path, indexed_paths.get('document_paths', [])):
-            print(f"\nDetected document file in indexed path, indexing text content...")
+            print("\nDetected document file in indexed path, indexing text content...")
             doc_success = index_document(file_path)
             success = success and doc_success
         else:
-            print(f"\nDocument file not in indexed paths, skipping text indexing")
+            print("\nDocument file not in indexed paths, skipping text indexing")
             print(f"(Document paths: {indexed_paths.get('document_paths', [])})")
     
     print(f"\n{'='*60}")
@@ -448,14 +668,16 @@ def auto_index(file_path: str) -> bool:
 def main():
     """Main entry point for command-line usage"""
     if len(sys.argv) < 2:
-        print("Usage: python auto_index.py <file_path>")
+        print("Usage: python auto_index.py <file_path> [<file_path> ...]")
         print("\nExample:")
         print("  python auto_index.py C:\\Users\\Documents\\test.pdf")
         print("  python auto_index.py \"C:\\Users\\Pictures\\photo.jpg\"")
         sys.exit(1)
     
-    file_path = sys.argv[1]
-    success = auto_index(file_path)
+    # Several paths share one writer, so their file search rows go in as one batch
+    with FileSearchWriter() as writer:
+        results = [auto_index(file_path, writer) for file_path in sys.argv[1:]]
+    success = all(results)
     
     sys.exit(0 if success else 1)
 
@@ -5,11 +5,27 @@ import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 TREES_DIR = os.path.join(DATA_DIR, "trees")
+TREES_FILE = os.path.join(TREES_DIR, "trees.pkl")  #all legacy search trees in one pickle
 IMAGE_EMBEDDINGS_DB = os.path.join(DATA_DIR, "image_embeddings.db") #Stoered image embeddings
+IMAGE_EMBEDDINGS_STORE = os.path.join(DATA_DIR, "image_embeddings.f32") #contiguous [N, 512] float32 copy of the image embeddings, memory-mapped for search
+IMAGE_PATHS_STORE = os.path.join(DATA_DIR, "image_paths.json") #image paths matching the rows of IMAGE_EMBEDDINGS_STORE
+IMAGE_ANN_INDEX = os.path.join(DATA_DIR, "image_embeddings.faiss") #HNSW index over IMAGE_EMBEDDINGS_STORE, only built for large libraries
 TEXT_EMBEDDINGS_DB = os.path.join(DATA_DIR, "text_embeddings.db") #Stored text embeddings
 FILE_SEARCH_DB = os.path.join(DATA_DIR, "file_search.db") #stored file search database
 FILE_DATA_JSON = os.path.join(DATA_DIR, "file_data.json")  #stored file metadata for image embeddings
+FILE_DATA_JOURNAL = os.path.join(DATA_DIR, "file_data.jsonl")  #entries appended by auto_index, folded into FILE_DATA_JSON periodically
+FILE_DATA_JOURNAL_MAX_BYTES = 256 * 1024  # Compact the journal into file_data.json once it grows past this size
 INDEXED_PATHS_JSON = os.path.join(DATA_DIR, "indexed_paths.json")  #stored paths user chose to index for images/documents
+PREPROC_CACHE_DIR = os.path.join(DATA_DIR, "preproc_cache")  #cached CLIP-preprocessed images, reused on re-index
+LOG_FILE = os.path.join(DATA_DIR, "app.log")  #background log file written by the search API
+
+# Embedding sizes, used to tell float16 BLOBs from legacy float32 ones
+IMAGE_EMBEDDING_DIM = 512  # CLIP ViT-B/32
+TEXT_EMBEDDING_DIM = 768  # e5-base-v2
+
+# Logging level for the app log, DEBUG traces every search call
+LOG_LEVEL = "WARNING"
+TIMEIT_ENABLED = bool(os.environ.get("SMARTSEARCH_TIMEIT"))  # @timeit only measures and prints when this env var is set
 
 # UI Settings
 UI_DIR = os.path.join(BASE_DIR, "ui")
@@ -23,15 +39,34 @@ ROOT_INDEXING_PATH = "C:/"
 VALID_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp"}
 VALID_DOCUMENT_EXTENSIONS = {".pdf", ".docx", ".txt", ".md"}
 BATCH_SIZE = 5000  # SQLite batch insert size for file indexing, the higher, the faster but more memory usage
+TEXT_INSERT_BATCH = 10000  # Document chunks committed per transaction during document indexing
+EXTRACT_WORKERS = 4  # Threads extracting text from upcoming documents while the current chunks are embedded
+SCAN_WORKERS = 8  # Threads listing folders in parallel during a full file scan
+
+BATCH_SIZE_CLIP = 64  # Images encoded per CLIP forward pass, lower it if the GPU runs out of memory
+COMPILE_CLIP = True  # torch.compile the CLIP image encoder for bulk indexing (first batch is slower while it compiles)
+# Processes decoding/preprocessing images while the GPU encodes. Windows spawns workers, which re-import
+# the app (and load the text and CLIP models again) in each one, so images are loaded in-process there
+CLIP_LOADER_WORKERS = 0 if os.name == "nt" else max(1, (os.cpu_count() or 2) // 2)
+
+CACHE_PREPROCESSED_IMAGES = False  # Keep resized 224x224 thumbnails on disk (~150 KB each) so re-indexing skips decoding and resizing
+PREPROC_CACHE_MAX_MB = 2048  # Least recently used thumbnails are evicted past this size when image indexing finishes
+
+CONTENT_HASH_MAX_BYTES = 64 * 1024 * 1024  # Larger files are fingerprinted by mtime + size instead of hashing their bytes
 
 MIN_IMAGE_SIZE_KB = 10 # Minimum image file size to consider (in KB) helps distinguish real images from icons/thumbnails
 
 # Search Settings
 DEFAULT_SEARCH_LIMIT = 200  # Default number of search results
 MAX_IMAGE_SEARCH_RESULTS = 50  # Maximum results for image search
+ANN_MIN_IMAGES = 100_000  # Build a faiss HNSW index (if faiss is installed) once the library has this many images, below it brute force is faster
 
 # Text search model
 TEXT_SEARCH_MODEL = "intfloat/e5-base-v2"
+# Use an int8 ONNX export of the text model for auto-indexing when onnxruntime/optimum are installed.
+# Off by default: bulk indexing and queries use the fp32 model, and mixing the two skews ranking
+USE_ONNX_TEXT_MODEL = False
+TEXT_ONNX_DIR = os.path.join(DATA_DIR, "text_model_onnx")  #quantized ONNX export of TEXT_SEARCH_MODEL
 
 # Skip patterns for file indexing
 SKIP_FOLDERS = {
@@ -1,68 +1,122 @@
 """File and folder indexing functionality"""
 import os
 import string
-from typing import List
+from functools import lru_cache
+from typing import List, Tuple, Iterator
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from models.data_models import FileData
-from utils.helpers import is_hidden, is_accessible, timeit
-from config import SKIP_FOLDERS, SKIP_FILES, SKIP_PATTERNS, ROOT_INDEXING_PATH, VALID_SYMBOLS
+from utils.helpers import is_hidden_entry, is_accessible_entry, has_skip_pattern
+from config import SKIP_FOLDERS, SKIP_FILES, ROOT_INDEXING_PATH, VALID_SYMBOLS, SCAN_WORKERS
 from pyuac import main_requires_admin
 
 
+# Allowed filename characters, and a translate table that deletes them
+_ALLOWED = frozenset(string.ascii_letters + string.digits) | VALID_SYMBOLS
+_DELETE_ALLOWED = str.maketrans('', '', ''.join(_ALLOWED))
+
+
+# Names like index.js or README.md repeat thousands of times over a drive, reuse their verdict
+@lru_cache(maxsize=1 << 17)
 def has_valid_characters(filename: str) -> bool:
-    """Check if filename contains only valid characters (letters, digits, and valid symbols)"""
-    ALLOWED = set(string.ascii_letters + string.digits).union(VALID_SYMBOLS)
-    return all(ch in ALLOWED for ch in filename)
+    """Check if filename contains only valid characters (nothing is left once they're deleted)"""
+    return not filename.translate(_DELETE_ALLOWED)
 
 
-def collect_entries(root_dir: str) -> List[FileData]:
+def _scan_dir(root: str, file_list: List[Tuple[str, str, str]], subdirs: List[str]) -> int:
     """
-    Collect accessible files and folders (skipping hidden/system and special dirs).
-    Returns list of FileData(name, full_path, type).
+    List one directory, appending accepted entries to file_list and folders to descend into to subdirs.
+    Returns the number of entries skipped for unsupported characters.
     """
-    file_list = []
     skipped_count = 0
-
-    for root, dirs, files in os.walk(root_dir, topdown=True, onerror=lambda e: None):
-        allowed_dirs = []
-        for d in dirs:
-            full_d = os.path.join(root, d)
-            name_l = d.lower()
-
-            if any(pattern in name_l for pattern in SKIP_PATTERNS):
+    # scandir hands back DirEntry objects whose type (and on Windows, attributes) come
+    # from the directory listing itself, so most entries cost no extra stat call
+    try:
+        with os.scandir(root) as it:
+            entries = list(it)
+    except OSError:
+        return 0
+
+    for entry in entries:
+        name = entry.name
+        name_l = name.lower()
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            continue
+
+        if is_dir:
+            if has_skip_pattern(name_l):
                 continue
 
-            if (is_hidden(full_d) or name_l in SKIP_FOLDERS or not is_accessible(full_d)):
+            if (is_hidden_entry(entry) or name_l in SKIP_FOLDERS or not is_accessible_entry(entry)):
                 continue
-            
+
             # Skip directories with invalid characters
-            if not has_valid_characters(d):
+            if not has_valid_characters(name):
                 skipped_count += 1
                 continue
 
-            allowed_dirs.append(d)
-            file_list.append(FileData(d, full_d, 'folder'))
-
-        dirs[:] = allowed_dirs
-
-        for f in files:
-            full_f = os.path.join(root, f)
-            name_l = f.lower()
-
-            if (is_hidden(full_f) or name_l in SKIP_FILES or not is_accessible(full_f)):
+            # Like os.walk, list linked folders but don't descend into them
+            if not entry.is_symlink():
+                subdirs.append(entry.path)
+            file_list.append((name, entry.path, 'folder'))
+        else:
+            # No access() check for files: it costs a syscall per file, and opening one that
+            # turns out unreadable fails with a clear error anyway
+            if is_hidden_entry(entry) or name_l in SKIP_FILES:
                 continue
-            
+
             # Skip files with invalid characters
-            if not has_valid_characters(f):
+            if not has_valid_characters(name):
                 skipped_count += 1
                 continue
 
-            ext = os.path.splitext(f)[1].lower().strip('.') or 'unknown'
-            file_list.append(FileData(f, full_f, ext))
+            # Same result as splitext for normal names, without building the stem string
+            dot = name.rfind('.')
+            ext = name_l[dot + 1:] if dot > 0 else ''
+            file_list.append((name, entry.path, ext or 'unknown'))
+
+    return skipped_count
+
+
+def _scan_task(root: str):
+    """Run _scan_dir on a worker thread. Returns (entries, subdirs, skipped_count)"""
+    file_list = []
+    subdirs = []
+    skipped_count = _scan_dir(root, file_list, subdirs)
+    return file_list, subdirs, skipped_count
+
+
+def iter_entries(root_dir: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Yield accessible files and folders (skipping hidden/system and special dirs) as they are found.
+    Yields (name, full_path, type) tuples.
+    """
+    skipped_count = 0
+
+    # Every directory is its own task and its subfolders are queued as they are found,
+    # so one huge folder (e.g. Users) is spread over all workers instead of pinning one.
+    # scandir releases the GIL, so several directory listings are in flight at once
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+        running = {executor.submit(_scan_task, root_dir)}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                entries, subdirs, skipped = future.result()
+                skipped_count += skipped
+                running.update(executor.submit(_scan_task, d) for d in subdirs)
+                yield from entries
     
     if skipped_count > 0:
         print(f"Skipped {skipped_count} items with unsupported characters")
 
-    return file_list
+
+def collect_entries(root_dir: str) -> List[FileData]:
+    """
+    Collect accessible files and folders (skipping hidden/system and special dirs).
+    Returns list of FileData(name, full_path, type).
+    """
+    return [FileData(*entry) for entry in iter_entries(root_dir)]
 
 
 
@@ -87,28 +141,20 @@ def index_files(root_dir: str = ROOT_INDEXING_PATH, progress_callback=None) -> d
             progress_callback('scanning', 'Scanning files... This may take a while depending on storage size')
         
         print(f"Scanning directory: {root_dir}")
-        entries = collect_entries(root_dir)
-        total = len(entries)
-        
-        if progress_callback:
-            progress_callback('building', f'Building search index for {total:,} entries...')
-        
-        print(f"Building search index for {total:,} entries...")
         
         # Old tree-based method (commented out)
+        # entries = collect_entries(root_dir)
         # build_trees(entries, progress_callback)
         # entries.clear()
         # del entries
         # save_trees()
         # clear_trees()
         
-        # New SQLite-based method
-        build_search_index(entries, progress_callback)
-        
-        # Entries are already cleared by build_search_index (sets teh values to None during iteration to free up memory)
-        print("Clearing file list from memory...")
-        entries.clear()
-        del entries
+        # New SQLite-based method: the walker streams straight into batched inserts, no full file list in memory
+        building = None
+        if progress_callback:
+            building = lambda done, _: progress_callback('building', f'Building search index... {done:,} entries so far')
+        total = build_search_index(iter_entries(root_dir), building)
         
         if progress_callback:
             progress_callback('complete', f'Indexing complete! Indexed {total:,} files and folders')
@@ -1,16 +1,38 @@
 """Image indexing functionality - Generate and store image descriptions"""
 import os
 import time
-from utils.helpers import find_media
+from utils.helpers import find_media, quantize_embedding
 import torch
+import torch.nn.functional as F
 import clip
-from PIL import Image
+from torch.utils.data import DataLoader
 import numpy as np
 import sqlite3
-from config import IMAGE_EMBEDDINGS_DB
+from utils.image_preprocess import ImageDataset, collate_images, prune_preprocessed_cache
+from config import IMAGE_EMBEDDINGS_DB, BATCH_SIZE_CLIP, CLIP_LOADER_WORKERS, COMPILE_CLIP, CACHE_PREPROCESSED_IMAGES
+from utils.embedding_store import rebuild_store
+from utils.db import open_bulk
 
 device = "cuda" if torch.cuda.is_available() else "cpu"
 model, preprocess = clip.load("ViT-B/32", device=device)
+model = model.eval().half() if device == "cuda" else model.eval()  # fp16 on Tensor Cores
+
+# Graph-captured image tower; compilation is lazy, so failures (e.g. no Triton on Windows) only show on first use
+compiled_visual = None
+if COMPILE_CLIP and hasattr(torch, "compile"):
+    compiled_visual = torch.compile(model.visual, mode="reduce-overhead" if device == "cuda" else "default")
+
+
+def encode_images(batch):
+    """Encode a preprocessed batch with the compiled image tower, falling back to eager mode if it fails"""
+    global compiled_visual
+    if compiled_visual is not None:
+        try:
+            return compiled_visual(batch.type(model.dtype))
+        except Exception as e:
+            print(f"torch.compile unavailable, using eager CLIP: {e}")
+            compiled_visual = None
+    return model.encode_image(batch)
 
 
 def init_db():
@@ -23,9 +45,14 @@ def init_db():
         CREATE TABLE IF NOT EXISTS embeddings (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             path TEXT UNIQUE,
-            embedding BLOB
+            embedding BLOB,
+            content_hash TEXT
         )
     """)
+    # Databases created before content hashing lack the column
+    if 'content_hash' not in {row[1] for row in c.execute("PRAGMA table_info(embeddings)")}:
+        c.execute("ALTER TABLE embeddings ADD COLUMN content_hash TEXT")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_hash ON embeddings(path, content_hash)")
     
     conn.commit()
     conn.close()
@@ -36,18 +63,28 @@ def save_embeddings(image_paths, image_embeddings):
     """
     Saves the embeddings to an SQL file
     param image_paths: list of image file paths
-    param image_embeddings: list of corresponding image embeddings
+    param image_embeddings: list of corresponding image embeddings, already L2-normalized
     """
-    conn = sqlite3.connect(IMAGE_EMBEDDINGS_DB)
+    conn = open_bulk(IMAGE_EMBEDDINGS_DB)
     c = conn.cursor()
 
-    for path, embedding in zip(image_paths, image_embeddings):
-        embedding = embedding.squeeze().astype(np.float32)  # ensure shape [512], correct type
-        c.execute("INSERT OR REPLACE INTO embeddings (path, embedding) VALUES (?, ?)",
-                  (path, embedding.tobytes()))
+    # int8 with a per-vector scale, 516 bytes per image
+    rows = [(path, quantize_embedding(embedding))
+            for path, embedding in zip(image_paths, image_embeddings)]
 
+    # One transaction for all rows instead of an fsync per INSERT. The content-hash index is
+    # dropped for the bulk load and rebuilt once afterwards instead of updated row by row
+    # (path keeps its UNIQUE index, INSERT OR REPLACE needs it)
+    conn.execute("BEGIN")
+    c.execute("DROP INDEX IF EXISTS idx_embeddings_hash")
+    c.executemany("INSERT OR REPLACE INTO embeddings (path, embedding) VALUES (?, ?)", rows)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_hash ON embeddings(path, content_hash)")
     conn.commit()
+    conn.execute("ANALYZE")
     conn.close()
+
+    # Refresh the memory-mapped copy used by image search
+    rebuild_store()
     print("Embeddings stored successfully!")
 
 
@@ -70,24 +107,52 @@ def index_images(path_list: list = None, progress_callback=None) -> dict:
         images = find_media(path_list)
         print(f"Found {len(images)} images to index")
         
-        image_embeddings = []
-        for idx, path in enumerate(images):
-            image = preprocess(Image.open(path)).unsqueeze(0).to(device)
-            with torch.no_grad():
-                embedding = model.encode_image(image)
-                embedding = embedding / embedding.norm(dim=-1, keepdim=True)  # Normalize
-            image_embeddings.append(embedding.cpu().numpy().squeeze())  # Save as shape [512]
+        # Worker processes (when enabled) decode/preprocess upcoming batches while the model encodes the current one
+        use_cuda = device == "cuda"
+        loader = DataLoader(
+            ImageDataset(images, preprocess),
+            batch_size=BATCH_SIZE_CLIP,
+            num_workers=CLIP_LOADER_WORKERS,
+            pin_memory=use_cuda,
+            prefetch_factor=2 if CLIP_LOADER_WORKERS else None,
+            collate_fn=collate_images
+        )
+        
+        # Encode in batches so each CLIP forward pass (and GPU transfer) covers many images
+        indexed_paths = []
+        device_batches = []  # Still on the GPU, copied back in large chunks instead of syncing every batch
+        host_chunks = []
+        done = 0
+        for batch, paths in loader:
+            done += BATCH_SIZE_CLIP
+            if batch is not None:
+                batch = batch.to(device, dtype=model.dtype, non_blocking=use_cuda)
+                with torch.inference_mode():
+                    embeddings = F.normalize(encode_images(batch), dim=-1)
+                # fp16 on the device halves both VRAM use and the copy back; rows are quantized to int8 anyway
+                device_batches.append(embeddings.half())  # [batch, 512]
+                indexed_paths.extend(paths)
+                if len(device_batches) >= 1024:  # ~64 MB of fp16 embeddings at the default batch size
+                    host_chunks.append(torch.cat(device_batches).cpu())
+                    device_batches.clear()
             
-            if progress_callback and idx % 10 == 0:
-                progress_callback(idx, len(images))
+            if progress_callback:
+                progress_callback(min(done, len(images)), len(images))
+        
+        if device_batches:
+            host_chunks.append(torch.cat(device_batches).cpu())
         
-        save_embeddings(images, image_embeddings)
+        # One [N, 512] array, saved in a single transaction at the end
+        image_embeddings = torch.cat(host_chunks).float().numpy() if host_chunks else np.empty((0, 512), np.float32)
+        save_embeddings(indexed_paths, image_embeddings)
+        # Thumbnails of deleted images go now; with caching turned off the whole cache is cleared
+        prune_preprocessed_cache(images if CACHE_PREPROCESSED_IMAGES else ())
         print("Image indexing complete!")
         
         return {
             "status": "success",
-            "message": f"Successfully indexed {len(images)} images from {len(path_list)} path(s)",
-            "count": len(images)
+            "message": f"Successfully indexed {len(indexed_paths)} images from {len(path_list)} path(s)",
+            "count": len(indexed_paths)
         }
     except Exception as e:
         print(f"Error indexing images: {e}")
@@ -1,15 +1,28 @@
 """Text/document indexing functionality - Index document contents for full-text search"""
 import os
+import re
+import queue
 import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+import torch
 from typing import List, Callable, Optional, Dict, Any
 from sentence_transformers import SentenceTransformer
 from PyPDF2 import PdfReader
 from docx import Document
-from config import TEXT_EMBEDDINGS_DB, TEXT_SEARCH_MODEL, VALID_DOCUMENT_EXTENSIONS
+try:
+    import fitz  # PyMuPDF, C extraction is several times faster than PyPDF2
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+from utils.helpers import scan_files, has_skip_pattern
+from utils.db import open_bulk
+from config import TEXT_EMBEDDINGS_DB, TEXT_SEARCH_MODEL, VALID_DOCUMENT_EXTENSIONS, TEXT_INSERT_BATCH, EXTRACT_WORKERS
 
 # Initialize model (fully local)
-model = SentenceTransformer(TEXT_SEARCH_MODEL)
+model = SentenceTransformer(TEXT_SEARCH_MODEL, device="cuda" if torch.cuda.is_available() else "cpu")
 
 # ---------- Utility: create DB if not exists ----------
 def init_db():
@@ -21,42 +34,43 @@ def init_db():
             file_path TEXT,
             chunk_index INTEGER,
             embedding BLOB,
-            content TEXT
+            content TEXT,
+            content_hash TEXT
         )
     """)
+    # Databases created before content hashing lack the column
+    if 'content_hash' not in {row[1] for row in cur.execute("PRAGMA table_info(embeddings)")}:
+        cur.execute("ALTER TABLE embeddings ADD COLUMN content_hash TEXT")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_hash ON embeddings(file_path, content_hash)")
     conn.commit()
     conn.close()
 
 
+_DOC_EXT_TUPLE = tuple(VALID_DOCUMENT_EXTENSIONS)  # str.endswith takes a tuple
+
+
 def find_document_files(paths: List[str]) -> List[str]:
     """Find all document files in the given paths"""
-    from config import SKIP_PATTERNS
-    
     document_files = []
+    skipped_dirs = {}
 
     for path in paths:
         if not os.path.exists(path):
             continue
             
         if os.path.isfile(path):
-            ext = os.path.splitext(path)[1].lower()
-            if ext in VALID_DOCUMENT_EXTENSIONS:
+            if path.lower().endswith(_DOC_EXT_TUPLE):
                 document_files.append(path)
         elif os.path.isdir(path):
-            for root, _, files in os.walk(path):
-                # Skip hidden and system folders
-                if any(skip in root.lower() for skip in ['$recycle', 'system volume', 'windows', 'appdata']):
-                    continue
-                
-                # Skip paths containing skip patterns
-                root_lower = root.lower()
-                if any(pattern in root_lower for pattern in SKIP_PATTERNS):
-                    continue
-                    
-                for file in files:
-                    ext = os.path.splitext(file)[1].lower()
-                    if ext in VALID_DOCUMENT_EXTENSIONS:
-                        document_files.append(os.path.join(root, file))
+            # Shared, cached walk: indexing images from the same folders doesn't walk them again
+            for root, file in scan_files([path], VALID_DOCUMENT_EXTENSIONS):
+                if root not in skipped_dirs:
+                    # Skip hidden and system folders, and paths containing skip patterns
+                    root_lower = root.lower()
+                    skipped_dirs[root] = (any(skip in root_lower for skip in ['$recycle', 'system volume', 'windows', 'appdata'])
+                                          or has_skip_pattern(root_lower))
+                if not skipped_dirs[root]:
+                    document_files.append(os.path.join(root, file))
 
     return document_files
 
@@ -66,8 +80,12 @@ def extract_text(file_path):
     text = ""
 
     if ext == ".pdf":
-        reader = PdfReader(file_path)
-        text = "\n".join([page.extract_text() or "" for page in reader.pages])
+        if PYMUPDF_AVAILABLE:
+            with fitz.open(file_path) as doc:
+                text = "\n".join(page.get_text("text") for page in doc)
+        else:
+            reader = PdfReader(file_path)
+            text = "\n".join([page.extract_text() or "" for page in reader.pages])
 
     elif ext == ".docx":
         doc = Document(file_path)
@@ -83,52 +101,125 @@ def extract_text(file_path):
     return text.strip()
 
 
-def chunk_text(text, size=1000, overlap=100):
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), size - overlap):
-        chunk = " ".join(words[i:i + size])
-        if chunk.strip():
-            chunks.append(chunk)
-    return chunks
+_WORD = re.compile(r"\S+")
 
 
-def embed_text(text):
-    emb = model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
-    return emb.astype(np.float32)
+def chunk_text(text, size=1000, overlap=100):
+    """Split text into windows of size words overlapping by overlap words.
+    Only word offsets are computed; each chunk is one slice of the original text (whitespace kept as is).
+    """
+    spans = np.fromiter((i for m in _WORD.finditer(text) for i in m.span()), dtype=np.int64).reshape(-1, 2)
+    n = len(spans)
+    if n <= size:
+        return [text] if n else []
+    first = np.arange(0, n, size - overlap)
+    last = np.minimum(first + size, n) - 1
+    return [text[s:e] for s, e in zip(spans[first, 0].tolist(), spans[last, 1].tolist())]
 
 
-def chunk_and_save(file_path):
-    init_db()
+def extract_and_chunk(file_path) -> List[str]:
+    """Extract a document's text and split it into chunks, without touching the database"""
     try:
         text = extract_text(file_path)
     except Exception as e:
         print(f"Error extracting text from {file_path}: {e}")
-        return
+        return []
         
     if not text:
         print(f"No readable text found in {file_path}")
-        return
+        return []
 
-    # Chunk if necessary
-    chunks = chunk_text(text) if len(text.split()) > 1000 else [text]
+    # Chunk if necessary, short documents come back as a single chunk
+    return chunk_text(text)
 
-    conn = sqlite3.connect(TEXT_EMBEDDINGS_DB)
-    cur = conn.cursor()
 
-    for i, chunk in enumerate(chunks):
-        try:
-            emb = embed_text(chunk)
-            cur.execute(
-                "INSERT INTO embeddings (file_path, chunk_index, embedding, content) VALUES (?, ?, ?, ?)",
-                (file_path, i, emb.tobytes(), chunk),
-            )
-        except Exception as e:
-            print(f"Error embedding chunk {i} from {file_path}: {e}")
+def embed_chunks(pending):
+    """
+    Embed (file_path, chunk_index, chunk) tuples in one encode call.
+    Returns the matching database rows.
+    """
+    embeddings = model.encode([chunk for _, _, chunk in pending], batch_size=64, convert_to_numpy=True,
+                              normalize_embeddings=True, show_progress_bar=False)
+    return [(file_path, i, emb.astype(np.float16).tobytes(), chunk)
+            for (file_path, i, chunk), emb in zip(pending, embeddings)]
 
-    conn.commit()
-    conn.close()
-    print(f"  Saved {len(chunks)} chunks from {os.path.basename(file_path)}")
+
+def embed_chunks_safe(pending):
+    """
+    embed_chunks that never raises: a failing batch (e.g. CUDA out of memory) is retried in halves,
+    and a chunk that still fails on its own is logged and skipped.
+    """
+    try:
+        return embed_chunks(pending)
+    except Exception as e:
+        if len(pending) == 1:
+            file_path, i, _ = pending[0]
+            print(f"Skipping chunk {i} of {file_path}: {e}")
+            return []
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        mid = len(pending) // 2
+        return embed_chunks_safe(pending[:mid]) + embed_chunks_safe(pending[mid:])
+
+
+def write_rows(row_batches: queue.Queue, errors: list):
+    """
+    Database writer thread: drains row batches until the None sentinel,
+    committing every TEXT_INSERT_BATCH rows. Owns the only connection, SQLite writes stay on one thread.
+    A failed commit is logged and its rows dropped; only failing to open the database stops the run.
+    """
+    rows = []
+    batch = []
+    conn = None
+    try:
+        conn = open_bulk(TEXT_EMBEDDINGS_DB)
+        # Rebuilt once at the end instead of updated for every inserted chunk
+        conn.execute("DROP INDEX IF EXISTS idx_embeddings_hash")
+        while True:
+            batch = row_batches.get()
+            if batch is not None:
+                rows.extend(batch)
+            if rows and (batch is None or len(rows) >= TEXT_INSERT_BATCH):
+                try:
+                    with conn:
+                        conn.executemany(
+                            "INSERT INTO embeddings (file_path, chunk_index, embedding, content) VALUES (?, ?, ?, ?)",
+                            rows,
+                        )
+                    print(f"  Saved {len(rows)} chunks")
+                except sqlite3.Error as e:
+                    print(f"  Failed to save {len(rows)} chunks: {e}")
+                rows = []
+            if batch is None:
+                break
+    except Exception as e:
+        errors.append(e)
+        # Keep draining so the embedding loop never blocks on a full queue
+        while batch is not None:
+            batch = row_batches.get()
+    finally:
+        if conn is not None:
+            try:
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_hash ON embeddings(file_path, content_hash)")
+                conn.execute("ANALYZE")
+            except sqlite3.Error as e:
+                print(f"  Could not rebuild the embeddings index: {e}")  # init_db recreates it on the next run
+            finally:
+                conn.close()
+
+
+def iter_extracted(documents, workers: int):
+    """Yield (document, chunks) in order while up to 2 * workers documents are being extracted in the background"""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for document in documents:
+            in_flight.append((document, executor.submit(extract_and_chunk, document)))
+            if len(in_flight) >= 2 * workers:
+                document, future = in_flight.popleft()
+                yield document, future.result()
+        while in_flight:
+            document, future = in_flight.popleft()
+            yield document, future.result()
 
 
 def cosine_similarity(a, b):
@@ -180,11 +271,32 @@ def index_documents(path_list: List[str] = None, progress_callback: Optional[Cal
             progress_callback('indexing', 0, len(documents), f'Indexing {len(documents)} documents...')
         
         print("Indexing document contents...")
-        for idx, document in enumerate(documents):
-            chunk_and_save(document)
-            
-            if progress_callback:
-                progress_callback('indexing', idx + 1, len(documents), f'Indexing: {os.path.basename(document)}')
+        
+        # Three stages run at once: extractor threads parse upcoming documents, this thread embeds
+        # chunks from many documents together, and a writer thread commits TEXT_INSERT_BATCH rows at a time
+        row_batches = queue.Queue(maxsize=8)
+        writer_errors = []
+        writer = threading.Thread(target=write_rows, args=(row_batches, writer_errors))
+        writer.start()
+        pending = []
+        try:
+            for idx, (document, chunks) in enumerate(iter_extracted(documents, EXTRACT_WORKERS)):
+                pending.extend((document, i, chunk) for i, chunk in enumerate(chunks))
+                if len(pending) >= 256:
+                    row_batches.put(embed_chunks_safe(pending))
+                    pending = []
+                
+                if progress_callback:
+                    progress_callback('indexing', idx + 1, len(documents), f'Indexing: {os.path.basename(document)}')
+                if writer_errors:
+                    break
+            if pending and not writer_errors:
+                row_batches.put(embed_chunks_safe(pending))
+        finally:
+            row_batches.put(None)
+            writer.join()
+        if writer_errors:
+            raise writer_errors[0]
         
         # Stage 3: Complete
         if progress_callback:
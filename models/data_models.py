@@ -1,5 +1,5 @@
 """Data models for file and tree structures"""
-import string
+import sys
 
 # The following Tree model was used for indexing files and folders into a tree structure
 # Since the indexing has moved to SQLite, this is retained for reference and potential future use.
@@ -24,56 +24,68 @@ class Tree:
     # Reverse mapping (for saving and loading)
     REVERSE_MAP = {v: k for k, v in {**SYMBOL_MAP, **DIGIT_MAP}.items()}
 
+    # Children live in one dict keyed by the safe name (letter, num0, dash, ...),
+    # only the branches that exist are stored
+    __slots__ = ("value", "files", "children")
+
     def __init__(self, value):
         self.value = value
         self.files = []
-
-        # Create letter attributes
-        for ch in string.ascii_lowercase:
-            setattr(self, ch, None)
-
-        # Create digit and symbol attributes (safe names)
-        for name in [*self.SYMBOL_MAP.values(), *self.DIGIT_MAP.values()]:
-            setattr(self, name, None)
+        self.children = {}
 
     def to_dict(self):
         """Convert tree into a serializable dict"""
-        data = {
+        return {
             "value": self.value,
             "files": [f.to_dict() for f in self.files],
+            "children": {key: child.to_dict() for key, child in self.children.items()},
         }
 
-        # Serialize letters, digits, and symbols
-        for ch in string.ascii_lowercase:
-            child = getattr(self, ch)
-            if child:
-                data[ch] = child.to_dict()
-
-        for name in [*self.SYMBOL_MAP.values(), *self.DIGIT_MAP.values()]:
-            child = getattr(self, name)
-            if child:
-                data[name] = child.to_dict()
+    def __getstate__(self):
+        # Positional tuple instead of the default dict of slot names, keeps the pickled forest small
+        return self.value, self.files, self.children
 
-        return data
+    def __setstate__(self, state):
+        self.value, self.files, self.children = state
 
     @classmethod
-    def from_dict(cls, data):
+    def from_dict(cls, data, _pool=None):
         """Rebuild a Tree object from its dictionary form"""
+        # A file is listed in every node along its name, the dump repeats it at each level;
+        # the pool maps those copies back to one shared FileData, as build_trees had it
+        pool = {} if _pool is None else _pool
         node = cls(data["value"])
-        node.files = [FileData.from_dict(f) if isinstance(f, dict) else f for f in data.get("files", [])]
+        node.files = [_pooled_file(f, pool) if isinstance(f, dict) else f for f in data.get("files", [])]
 
-        for key, value in data.items():
-            if key in ("value", "files"):
-                continue
+        children = data.get("children")
+        if children is None:
+            # Older dumps stored each child as a top-level key
+            children = {key: value for key, value in data.items() if key not in ("value", "files")}
+        for key, value in children.items():
             if isinstance(value, dict):
-                setattr(node, key, cls.from_dict(value))
+                node.children[key] = cls.from_dict(value, pool)
         return node
 
 
+def _pooled_file(data: dict, pool: dict) -> "FileData":
+    """FileData for a dumped file dict, reusing the instance already built for the same path and name"""
+    key = (data["file_path"], data["file_name"])
+    file_data = pool.get(key)
+    if file_data is None:
+        file_data = pool[key] = FileData.from_dict(data)
+        # Few distinct types across millions of files
+        if file_data.file_type:
+            file_data.file_type = sys.intern(file_data.file_type)
+    return file_data
+
+
 
 
 class FileData:
     """Represents a file or folder with metadata"""
+
+    # No per-instance __dict__, a full drive scan creates millions of these
+    __slots__ = ("file_name", "file_path", "file_type", "length")
     
     def __init__(self, name: str, path: str, type: str):
         self.file_name = name
@@ -84,6 +96,10 @@ class FileData:
     def __lt__(self, other):
         return self.length < other.length
 
+    def __reduce__(self):
+        # Pickled as its constructor arguments, length is recomputed on load
+        return FileData, (self.file_name, self.file_path, self.file_type)
+
     def to_dict(self):
         return {
             "file_name": self.file_name,
@@ -1,18 +1,25 @@
 """File and folder search functionality"""
 import os
-import json
+import sys
+import gc
+import atexit
+import threading
+import logging
+import pickle
+from contextlib import contextmanager
 import string
-from typing import List
+from typing import List, Iterable, Tuple
+from itertools import islice, starmap
 from models.data_models import Tree, FileData
-from config import DATA_DIR, TREES_DIR, SYMBOL_MAP, DIGIT_MAP, FILE_SEARCH_DB, BATCH_SIZE, DEFAULT_SEARCH_LIMIT
+from config import DATA_DIR, TREES_DIR, TREES_FILE, SYMBOL_MAP, DIGIT_MAP, FILE_SEARCH_DB, BATCH_SIZE, DEFAULT_SEARCH_LIMIT
 import sqlite3
-from utils.helpers import get_value, timeit
+from utils.helpers import name_to_keys, name_to_key, json_loads
+from utils.db import open_bulk, ensure_file_search_schema
 
+log = logging.getLogger(__name__)
 
-# Global trees dictionary
-trees = {}
 
-# Initialize trees
+# Every possible root name (letters, digits, symbols)
 all_names = (
     list(string.ascii_lowercase) +
     list(DIGIT_MAP.values()) +
@@ -21,79 +28,133 @@ all_names = (
 
 
  #THE FOLLOWING LINES OF CODE WAS OF A DIFFERENT APPROACH USING IN-MEMORY TREES NOT USING SQLITE. THIS CODE IS KEPT FOR REFERENCE BUT THE ACTUAL SEARCH USES SQLITE NOW
-trees = {name: Tree(name) for name in all_names}
+class _TreeDict(dict):
+    """Root trees by name, each built the first time it's touched instead of all of them at import"""
+    def __missing__(self, name):
+        tree = self[name] = Tree(name)
+        return tree
+
+
+# Global trees dictionary
+trees = _TreeDict()
+_forest_loaded = False  # the pickle holds every tree, so one load serves all lazy lookups
+_forest_lock = threading.Lock()
+# Letters search_tree has already tried to load; the per-letter locks stop concurrent searches loading twice
+_loaded_letters = set()
+_load_locks = {name: threading.Lock() for name in all_names}
+
+
+def _load_forest() -> bool:
+    """Load every tree from the single pickle written by save_trees(). Returns True if successful."""
+    global _forest_loaded
+    if _forest_loaded:
+        return True
+    with _forest_lock:
+        if _forest_loaded:
+            return True
+        if not os.path.isfile(TREES_FILE):
+            return False
+        try:
+            with _deep_recursion(), _gc_paused(), open(TREES_FILE, "rb") as f:
+                trees.update(pickle.load(f))
+            _forest_loaded = True
+            return True
+        except Exception as e:
+            log.warning("Failed to load %s: %s", TREES_FILE, e)
+            return False
+
+
+@contextmanager
+def _deep_recursion(limit: int = 10000):
+    """Pickle recurses once per trie level, allow for long file names"""
+    old = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old, limit))
+    try:
+        yield
+    finally:
+        sys.setrecursionlimit(old)
+
+
+@contextmanager
+def _gc_paused():
+    """Unpickling creates millions of nodes; without this the cyclic GC keeps rescanning them mid-load"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _tree_json_path(name: str) -> str:
+    return os.path.join(TREES_DIR, f"{name}tree.json")
+
+
+def _read_tree_json(name: str) -> Tree:
+    """Read and rebuild one legacy per-tree JSON file. Raises OSError/ValueError on failure."""
+    with open(_tree_json_path(name), "rb") as f:
+        return Tree.from_dict(json_loads(f.read()))
 
 
 def load_tree(name: str) -> bool:
     """Load a specific tree from disk. Returns True if successful."""
-    path = os.path.join(TREES_DIR, f"{name}tree.json")
+    if _load_forest():
+        log.debug("Loaded tree: %s", name)
+        return name in trees
+    
+    # Legacy per-tree JSON files
+    path = _tree_json_path(name)
     if not os.path.isfile(path):
-        print(f"Tree file not found: {path}")
+        log.debug("Tree file not found: %s", path)
         return False
     
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            loaded_tree = Tree.from_dict(data)
-            trees[name] = loaded_tree
-            print(f"Loaded tree: {name}")
-            return True
+        trees[name] = _read_tree_json(name)
+        log.debug("Loaded tree: %s", name)
+        return True
     except Exception as e:
-        print(f"Error loading tree {name}: {e}")
+        log.warning("Error loading tree %s: %s", name, e)
         return False
 
 
 def load_trees() -> int:
-    """Load trees from JSON files. Returns count loaded."""
-    loaded = 0
-    for letter in string.ascii_lowercase:
-        path = os.path.join(TREES_DIR, f"{letter}tree.json")
-        if not os.path.isfile(path):
-            continue
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                loaded_tree = Tree.from_dict(data)
-                trees[letter] = loaded_tree
-                loaded += 1
-        except Exception as e:
-            print(f"Warning: failed to load {path}: {e}")
+    """Load trees from the pickled forest, or from legacy per-tree JSON files. Returns count loaded."""
+    if _load_forest():
+        return len(trees)
     
-    # Load digit and symbol trees
-    for name in list(DIGIT_MAP.values()) + list(SYMBOL_MAP.values()):
-        path = os.path.join(TREES_DIR, f"{name}tree.json")
+    loaded = 0
+    for name in all_names:
+        path = _tree_json_path(name)
         if not os.path.isfile(path):
             continue
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                loaded_tree = Tree.from_dict(data)
-                trees[name] = loaded_tree
-                loaded += 1
+            trees[name] = _read_tree_json(name)
+            loaded += 1
         except Exception as e:
-            print(f"Warning: failed to load {path}: {e}")
+            log.warning("Failed to load %s: %s", path, e)
     
     return loaded
 
 
 def clear_trees() -> None:
     """Clear all tree data from memory to free up RAM."""
-    global trees
-    for name in trees:
-        trees[name] = Tree(name)
-    print("Cleared all tree data from memory")
+    global _forest_loaded
+    _forest_loaded = False
+    _loaded_letters.clear()
+    trees.clear()
+    log.debug("Cleared all tree data from memory")
 
 
 def save_trees() -> None:
-    """Save all trees to JSON files."""
-    for name, tree in trees.items():
-        if tree and hasattr(tree, 'files') and len(tree.files) > 0:
-            path = os.path.join(TREES_DIR, f"{name}tree.json")
-            try:
-                with open(path, "w", encoding="utf-8") as f:
-                    json.dump(tree.to_dict(), f, indent=2)
-            except Exception as e:
-                print(f"Error saving {path}: {e}")
+    """Save all trees to one pickle file (much faster to write and read back than per-tree JSON)."""
+    tmp_path = TREES_FILE + ".tmp"
+    try:
+        with _deep_recursion(), open(tmp_path, "wb") as f:
+            pickle.dump(dict(trees), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, TREES_FILE)
+    except Exception as e:
+        log.error("Error saving %s: %s", TREES_FILE, e)
 
 
 def build_trees(file_list: List[FileData], progress_callback=None) -> None:
@@ -102,59 +163,51 @@ def build_trees(file_list: List[FileData], progress_callback=None) -> None:
     
     total = len(file_list)
     for idx, files in enumerate(file_list):
-        if not check_letters(files.file_name):
+        name = files.file_name
+        if not check_letters(name):
             continue
-            
-        file_name_list = list(files.file_name)
-        first_letter = get_value(file_name_list[0].lower())
-        root_tree = trees[first_letter]
         
-        if len(files.file_name) == 1:
+        letters = name_to_keys(name)
+        root_tree = trees[letters[0]]
+        
+        if len(letters) == 1:
             root_tree.files.append(files)
             continue
-            
-        for i in range(1, len(file_name_list)):
-            letter = get_value(file_name_list[i].lower())
-            node = getattr(root_tree, letter)
-            
+        
+        # Every node below the root lists the file, so each prefix lookup is one walk
+        for letter in letters[1:]:
+            children = root_tree.children
+            node = children.get(letter)
             if node is None:
-                new_node = Tree(letter)
-                setattr(root_tree, letter, new_node)
-                root_tree = new_node
-                root_tree.files.append(files)
-            elif node is not None and i == len(file_name_list) - 1:
-                node.files.append(files)
-            elif node is not None:
-                root_tree = node
-                root_tree.files.append(files)
+                node = children[letter] = Tree(letter)
+            node.files.append(files)
+            root_tree = node
         
         if progress_callback and idx % 100 == 0:
             progress_callback(idx, total)
 
 
-@timeit
 def search_tree(prefix: str) -> List[FileData]:
     """Search for all files matching the prefix. Lazy-loads tree if needed."""
     if not prefix:
         return []
     
-    first_letter = get_value(prefix[0].lower())
-    current_node = trees.get(first_letter)
-    
-    # If tree is empty (just initialized), try to load it from disk
-    if current_node and not current_node.files and not hasattr(current_node, '_loaded'):
-        print(f"Lazy-loading tree for: {first_letter}")
-        if load_tree(first_letter):
-            current_node = trees.get(first_letter)
-            # Mark as loaded to avoid reloading
-            current_node._loaded = True
-    
-    if current_node is None:
-        return []
-    
-    for ch in prefix[1:]:
-        letter = get_value(ch.lower())
-        current_node = getattr(current_node, letter, None)
+    letters = name_to_keys(prefix)
+    first_letter = letters[0]
+    
+    # First search for this letter: load its tree from disk, once, even with concurrent searches
+    if first_letter not in _loaded_letters:
+        with _load_locks.setdefault(first_letter, threading.Lock()):
+            if first_letter not in _loaded_letters:
+                root = trees.get(first_letter)
+                if root is None or not root.files:
+                    log.debug("Lazy-loading tree for: %s", first_letter)
+                    load_tree(first_letter)
+                _loaded_letters.add(first_letter)
+    current_node = trees[first_letter]
+    
+    for letter in letters[1:]:
+        current_node = current_node.children.get(letter)
         if current_node is None:
             return []
     
@@ -167,6 +220,17 @@ def search_tree(prefix: str) -> List[FileData]:
 # This is a new approach that stores file data in SQLite instead of tree structures
 #THIS IS IMPLEMENTED AND WORKS WELL 
 
+# Extension/type → UI category, one dict probe per file instead of a scan of each list
+_CATEGORY_BY_TYPE = {
+    'folder': 'folder',
+    **dict.fromkeys(["png", "jpg", "jpeg", "gif", "bmp", "webp", "image"], 'image'),
+    **dict.fromkeys(["mp4", "mkv", "mov", "avi", "video"], 'video'),
+    **dict.fromkeys(["mp3", "wav", "flac", "m4a", "audio"], 'audio'),
+    **dict.fromkeys(["zip", "7z", "rar", "tar", "gz"], 'archive'),
+    **dict.fromkeys(["pdf", "ppt", "pptx", "xls", "xlsx", "csv", "md", "txt", "rtf", "doc", "docx"], 'document'),
+}
+
+
 def get_file_category(file_type: str) -> str:
     """
     Categorize file by its type/extension.
@@ -178,22 +242,7 @@ def get_file_category(file_type: str) -> str:
     Returns:
         Category string: 'image', 'video', 'audio', 'archive', 'document', 'folder', or 'file'
     """
-    t = (file_type or '').lower()
-    
-    if t == 'folder':
-        return 'folder'
-    if t in ["png", "jpg", "jpeg", "gif", "bmp", "webp", "image"]:
-        return 'image'
-    if t in ["mp4", "mkv", "mov", "avi", "video"]:
-        return 'video'
-    if t in ["mp3", "wav", "flac", "m4a", "audio"]:
-        return 'audio'
-    if t in ["zip", "7z", "rar", "tar", "gz"]:
-        return 'archive'
-    if t in ["pdf", "ppt", "pptx", "xls", "xlsx", "csv", "md", "txt", "rtf", "doc", "docx"]:
-        return 'document'
-    
-    return 'file'  # Default category
+    return _CATEGORY_BY_TYPE.get((file_type or '').lower(), 'file')  # 'file' is the default category
 
 
 def initiate_db():
@@ -204,125 +253,120 @@ def initiate_db():
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA synchronous=NORMAL")
     
-    cursor = conn.cursor()
-    
-    # Create table with normalized filename as primary key
-    # Added file_extension and file_category for efficient filtering
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS file_index (
-            prefix TEXT PRIMARY KEY,
-            file_extension TEXT NOT NULL,
-            file_category TEXT NOT NULL,
-            files_json TEXT NOT NULL
-        )
-    """)
-    
-    # Create index for faster LIKE queries
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_prefix ON file_index(prefix)
-    """)
-    
-    # Create index for category filtering
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_category ON file_index(file_category, prefix)
-    """)
-    
-    # Create index for extension filtering (for future use, current filtering is based on file_category)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_extension ON file_index(file_extension, prefix)
-    """)
-    
-    conn.commit()
+    # One row per file, with file_extension and file_category for efficient filtering
+    ensure_file_search_schema(conn)
+    
     conn.close()
     print(f"Initialized database at {FILE_SEARCH_DB}")
 
 
-def build_search_index(file_list: List[FileData], progress_callback=None, batch_size=BATCH_SIZE) -> None:
+def build_search_index(entries: Iterable[Tuple[str, str, str]], progress_callback=None, batch_size=BATCH_SIZE) -> int:
     """
-    Build SQLite search index from file list.
+    Build SQLite search index from a stream of entries.
     
-    Stores each unique filename once with array of FileData objects.
-    Uses SQLite's json_insert to append on conflict.
+    Stores one row per file, keyed by the normalized filename. Duplicate names are
+    plain extra rows, so every insert is O(1) however many files share a name.
     
     Args:
-        file_list: List of FileData objects to index
-        progress_callback: Optional callback for progress updates
-        batch_size: Number of files to insert per batch (default from config)
+        entries: Iterable of (name, full_path, type) tuples, e.g. straight from iter_entries()
+        progress_callback: Optional callback(done, total) for progress updates, total is None for generators
+        batch_size: Number of files per committed batch and between progress callbacks (default from config)
+    
+    Returns:
+        Number of files indexed
     
     Example:
-    - 'test.txt' at C:/Documents → stored once
-    - 'test.txt' at C:/Downloads → appended to same key
+    - 'test.txt' at C:/Documents → row with prefix 'test' + 'dot' + 'txt'
+    - 'test.txt' at C:/Downloads → second row with the same prefix
     """
     initiate_db()
     
-    conn = sqlite3.connect(FILE_SEARCH_DB)
+    conn = open_bulk(FILE_SEARCH_DB)
     
-    # Enable JSON functions
-    conn.execute("PRAGMA journal_mode=WAL")
-    
-    cursor = conn.cursor()
+    total = len(entries) if hasattr(entries, '__len__') else None
+    count = 0
+    entries = iter(entries)
     
-    total = len(file_list)
-    batch = []
+    # Committed every batch_size rows, so the write lock is only held for a moment at a time and the
+    # auto-index watcher can insert between batches. The secondary indexes stay in place, searches
+    # during a rebuild keep using them.
+    try:
+        count = _insert_entries(conn, entries, progress_callback, total, batch_size)
+    finally:
+        conn.close()
     
-    for idx, file_data in enumerate(file_list):
-        if not file_data.file_name:
-            continue
-        
-        # Normalize the filename to lowercase
-        normalized_name = file_data.file_name.lower()
-        
-        # Convert special characters using get_value since SQLite doesn't handle all of them well
-        prefix_chars = []
-        for char in normalized_name:
-            prefix_chars.append(get_value(char))
-        normalized_key = ''.join(prefix_chars)
-        
-        # Get file extension and category
-        file_extension = file_data.file_type.lower() if file_data.file_type else 'unknown'
-        file_category = get_file_category(file_extension)
-        
-        # Add to batch (key, extension, category, file_json, file_json for conflict)
-        file_json = json.dumps([file_data.to_dict()])
-        batch.append((normalized_key, file_extension, file_category, file_json, file_json))
-        
-        # Execute batch when size reached
-        if len(batch) >= batch_size:
-            # Use INSERT with ON CONFLICT to append
-            cursor.executemany("""
-                INSERT INTO file_index (prefix, file_extension, file_category, files_json) 
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(prefix) DO UPDATE SET
-                    files_json = json_insert(files_json, '$[#]', json(?))
+    print(f"Search index built with {count} files")
+    return count
+
+
+def _insert_entries(conn: sqlite3.Connection, entries, progress_callback, total, batch_size) -> int:
+    """Insert (name, path, type) entries, one executemany and commit per batch_size rows"""
+    count = 0
+    
+    def rows():
+        # Pulled batch_size rows at a time while the scan runs, no full file list is ever built
+        nonlocal count
+        for name, path, file_type in entries:
+            if not name:
+                continue
+            
+            # Get file extension and category
+            file_extension = file_type.lower() if file_type else 'unknown'
+            
+            count += 1
+            # Lowercase and convert special characters since SQLite doesn't handle all of them well
+            yield (name_to_key(name), file_extension, get_file_category(file_extension), name, path, file_type)
+    
+    pending = rows()
+    while batch := list(islice(pending, batch_size)):
+        # Plain appends, one transaction per batch
+        with conn:
+            conn.executemany("""
+                INSERT INTO files (prefix, file_extension, file_category, file_name, file_path, file_type)
+                VALUES (?, ?, ?, ?, ?, ?)
             """, batch)
-            conn.commit()
-            batch = []
-        
-        # Remove the saved file from memory to free up RAM :D 
-        file_list[idx] = None
-        
         # Progress callback yeah that's it
-        if progress_callback and idx % 100 == 0:
-            progress_callback(idx, total)
-    
-    # Insert remaining batch, if the if condition wasn't triggered
-    if batch:
-        cursor.executemany("""
-            INSERT INTO file_index (prefix, file_extension, file_category, files_json) 
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(prefix) DO UPDATE SET
-                files_json = json_insert(files_json, '$[#]', json(?))
-        """, batch)
-        conn.commit()
-    
-    conn.close()
-    print(f"Search index built with {total} files (unique filenames stored once)")
+        if progress_callback:
+            progress_callback(count, total)
+    return count
+
+
+# pywebview runs every JS API call on a fresh thread, so a per-thread connection would never be reused;
+# one shared connection (guarded by _read_lock) keeps the parsed schema and page cache warm instead
+_read_conn = None
+_read_lock = threading.RLock()
+
+
+def get_read_connection() -> sqlite3.Connection:
+    """The process-wide read-only connection to the file search index, opened on first use. Hold _read_lock while using it."""
+    global _read_conn
+    with _read_lock:
+        if _read_conn is None:
+            conn = sqlite3.connect(FILE_SEARCH_DB, check_same_thread=False)
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.execute("PRAGMA cache_size=-65536")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA journal_mode=WAL")
+            ensure_file_search_schema(conn)  # converts a database built with an older layout
+            conn.execute("PRAGMA query_only=1")
+            _read_conn = conn
+        return _read_conn
 
 
-def search_db(query: str, limit: int = DEFAULT_SEARCH_LIMIT, categories: List[str] = None) -> List[FileData]:
+@atexit.register
+def _close_read_connection():
+    global _read_conn
+    with _read_lock:
+        if _read_conn is not None:
+            _read_conn.close()
+            _read_conn = None
+
+
+def search_db(query: str, limit: int = DEFAULT_SEARCH_LIMIT, categories: List[str] = None,
+              conn: sqlite3.Connection = None) -> List[FileData]:
     """
     Search the SQLite database for files matching the query prefix.
-    Uses LIKE query to find all filenames starting with the prefix.
+    Uses a range query on the prefix index to find all filenames starting with the prefix.
     
     Args:
         query: Search prefix (e.g., 't', 'te', 'test')
@@ -330,6 +374,8 @@ def search_db(query: str, limit: int = DEFAULT_SEARCH_LIMIT, categories: List[st
         categories: Optional list of categories to filter by 
                    (e.g., ['image', 'video'], ['document'], ['folder'])
                    Categories: 'image', 'video', 'audio', 'archive', 'document', 'folder', 'file'
+        conn: Optional open connection to use. When omitted the shared
+              read-only connection is used (see get_read_connection).
     
     Returns:
         List of FileData objects matching the prefix and categories
@@ -343,63 +389,39 @@ def search_db(query: str, limit: int = DEFAULT_SEARCH_LIMIT, categories: List[st
         return []
     
     # Normalize query and convert special characters to SQLite-safe form
-    normalized_query = query.lower()
-    prefix_chars = []
-    for char in normalized_query:
-        prefix_chars.append(get_value(char))
-    prefix = ''.join(prefix_chars)
-    
-    conn = sqlite3.connect(FILE_SEARCH_DB)
-    cursor = conn.cursor()
+    prefix = name_to_key(query)
+    # Keys starting with prefix sort in [prefix, upper): a plain B-tree range, no LIKE pattern matching
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
     
     # Build query with optional category filtering
     if categories:
         # Create placeholders for IN clause
         placeholders = ','.join('?' * len(categories))
         query_sql = f"""
-            SELECT files_json FROM file_index
-            WHERE prefix LIKE ? AND file_category IN ({placeholders})
+            SELECT file_name, file_path, file_type FROM files
+            WHERE prefix >= ? AND prefix < ? AND file_category IN ({placeholders})
             LIMIT ?
         """
-        params = [prefix + '%'] + categories + [limit]
+        params = [prefix, upper] + categories + [limit]
     else:
         query_sql = """
-            SELECT files_json FROM file_index
-            WHERE prefix LIKE ?
+            SELECT file_name, file_path, file_type FROM files
+            WHERE prefix >= ? AND prefix < ?
             LIMIT ?
         """
-        params = [prefix + '%', limit]
+        params = [prefix, upper, limit]
     
-    cursor.execute(query_sql, params)
-    results = cursor.fetchall()
-    conn.close()
+    if conn is not None:
+        results = conn.execute(query_sql, params).fetchall()
+    else:
+        with _read_lock:
+            results = get_read_connection().execute(query_sql, params).fetchall()
     
     if not results:
         return []
     
-    # Deserialize all matching files
-    files = []
-    for row in results:
-        files_data = json.loads(row[0])
-        
-        # Handle both single array and nested arrays (due to json_insert behavior)
-        if isinstance(files_data, list):
-            for item in files_data:
-                # If item is a dict (FileData), add it directly
-                if isinstance(item, dict):
-                    files.append(FileData.from_dict(item))
-                # If item is a list (nested due to json_insert), flatten it
-                elif isinstance(item, list):
-                    for nested_item in item:
-                        if isinstance(nested_item, dict):
-                            files.append(FileData.from_dict(nested_item))
-            
-                # Stop if we've reached the search results limit
-                if len(files) >= limit:
-                    return files
-    
-    
-    return files
+    # Rows are already (name, path, type), the constructor's arguments; LIMIT capped the count
+    return list(starmap(FileData, results))
 
 
     
\ No newline at end of file
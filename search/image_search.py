@@ -1,20 +1,24 @@
 """Image search functionality - Search images by description"""
 import os
-import sqlite3
 import numpy as np
 import clip
 import torch
+import torch.nn.functional as F
 import threading
 import time
-from config import IMAGE_EMBEDDINGS_DB
+from functools import lru_cache
+from utils.embedding_store import is_store_fresh, open_store, rebuild_store, open_ann_index
 
 device = "cuda" if torch.cuda.is_available() else "cpu"
 #initialize the CLIP model
 model, preprocess = clip.load("ViT-B/32", device=device)
+model = model.eval().half() if device == "cuda" else model.eval()  # fp16 on Tensor Cores
 
 # Global variables for embeddings cache
 image_embeddings = None
 image_paths = None
+image_embeddings_gpu = None  # fp16 copy on the CUDA device, scored with one cuBLAS matmul
+ann_index = None  # faiss index, only present for large libraries
 embeddings_loaded = False
 last_access_time = None
 unload_timer = None
@@ -23,40 +27,31 @@ UNLOAD_DELAY = 120  # 2 minutes in seconds, after which embeddings are unloaded
 
 def load_embeddings():
     """
-    Loads the embeddings from the SQL database and normalizes them.
+    Loads the (already normalized at index time) embeddings, memory-mapping the contiguous store when it is
+    up to date and rebuilding it from the SQL database otherwise.
     This is called lazily when needed.
     """
-    global image_embeddings, image_paths, embeddings_loaded, last_access_time
+    global image_embeddings, image_paths, image_embeddings_gpu, ann_index, embeddings_loaded, last_access_time
     
     if embeddings_loaded:
         print("Embeddings already loaded, using cached data")
         last_access_time = time.time()
         return image_embeddings, image_paths
     
-    print("Loading embeddings from database...")
-    conn = sqlite3.connect(IMAGE_EMBEDDINGS_DB)
-    c = conn.cursor()
-
-    c.execute("SELECT path, embedding FROM embeddings")
-    rows = c.fetchall()
+    if is_store_fresh():
+        print("Memory-mapping embeddings store...")
+        image_embeddings, image_paths = open_store()
+    else:
+        # Store is missing or older than the DB, rebuild it from SQLite
+        print("Loading embeddings from database...")
+        image_embeddings, image_paths = rebuild_store()
 
-    if not rows:
+    if image_embeddings is None:
         print("No embeddings found in database")
-        conn.close()
         return None, None
-
-    image_paths = [row[0] for row in rows]
-
-    # Convert bytes back to float32 arrays
-    image_embeddings = np.vstack([
-        np.frombuffer(row[1], dtype=np.float32) for row in rows
-    ])
-
-    # Normalize the embeddings row-wise
-    norms = np.linalg.norm(image_embeddings, axis=1, keepdims=True)
-    image_embeddings = image_embeddings / norms
-
-    conn.close()
+    ann_index = open_ann_index()
+    if device == "cuda" and ann_index is None:
+        image_embeddings_gpu = to_device_fp16(image_embeddings)
     
     embeddings_loaded = True
     last_access_time = time.time()
@@ -68,17 +63,27 @@ def load_embeddings():
     return image_embeddings, image_paths
 
 
+def to_device_fp16(embeddings: np.ndarray, chunk: int = 65536) -> torch.Tensor:
+    """Copy the (memory-mapped) float32 matrix to the GPU as float16, a chunk at a time to keep host memory flat"""
+    out = torch.empty(embeddings.shape, dtype=torch.float16, device=device)
+    for start in range(0, len(embeddings), chunk):
+        out[start:start + chunk] = torch.from_numpy(np.array(embeddings[start:start + chunk])).to(device, torch.float16)
+    return out
+
+
 def unload_embeddings():
     """
     Unloads embeddings from memory to free up RAM.
     """
-    global image_embeddings, image_paths, embeddings_loaded, unload_timer
+    global image_embeddings, image_paths, image_embeddings_gpu, ann_index, embeddings_loaded, unload_timer
     
     current_time = time.time()
     if last_access_time and (current_time - last_access_time) >= UNLOAD_DELAY:
         print("Unloading embeddings from memory (inactive for 2 minutes)")
         image_embeddings = None
         image_paths = None
+        image_embeddings_gpu = None
+        ann_index = None
         embeddings_loaded = False
         unload_timer = None
     else:
@@ -116,6 +121,54 @@ def force_load_embeddings():
     return load_embeddings()
 
 
+def _encode_clip_texts(queries: list) -> np.ndarray:
+    """Encode queries with CLIP in one batched forward pass. Returns normalized float32 rows."""
+    tokens = clip.tokenize(queries).to(device)
+    with torch.inference_mode():
+        text_embeddings = F.normalize(model.encode_text(tokens), dim=-1)
+    # float32 so the CPU product goes through BLAS sgemm (CLIP returns float16 on CUDA)
+    return text_embeddings.float().cpu().numpy()
+
+
+@lru_cache(maxsize=1024)
+def _clip_text_emb(query: str) -> np.ndarray:
+    """Cached CLIP embedding of a single query, shape (1, dim)"""
+    text_embedding = _encode_clip_texts([query])
+    text_embedding.flags.writeable = False  # shared between callers through the cache
+    return text_embedding
+
+
+def _rank(text_embedding: np.ndarray, emb, paths, limit: int):
+    """Return the paths of the `limit` images closest to one (1, dim) query embedding"""
+    gpu_emb = image_embeddings_gpu
+    if gpu_emb is not None:
+        # fp16 matmul on the GPU, then top-K without a full sort
+        with torch.inference_mode():
+            query = torch.tensor(text_embedding[0], device=gpu_emb.device, dtype=gpu_emb.dtype)
+            similarities = (gpu_emb @ query).float()
+            k = min(limit, similarities.shape[0])
+            if k <= 0:
+                return []
+            indices = torch.topk(similarities, k).indices.tolist()
+        return [paths[i] for i in indices]
+
+    if ann_index is not None:
+        # Large library: walk the HNSW graph instead of scoring every image
+        _, indices = ann_index.search(text_embedding, limit)
+        return [paths[i] for i in indices[0] if i >= 0]
+
+    similarities = (text_embedding @ emb.T).squeeze(0)
+
+    # Partial top-K selection, only the K winners get sorted
+    k = min(limit, len(similarities))
+    if k <= 0:
+        return []
+    indices = np.argpartition(-similarities, k - 1)[:k]
+    indices = indices[np.argsort(-similarities[indices])]
+    
+    return [paths[i] for i in indices]
+
+
 def search_images(query: str, limit: int = 50):
     """
     Performs the search on the available embeddings.
@@ -137,15 +190,4 @@ def search_images(query: str, limit: int = 50):
     # Update last access time
     last_access_time = time.time()
     
-    # Perform search
-    text = clip.tokenize([query]).to(device)
-    
-    with torch.no_grad():
-        text_embedding = model.encode_text(text)
-        text_embedding = text_embedding / text_embedding.norm(dim=-1, keepdim=True)  # Normalize
-
-    text_embedding = text_embedding.cpu().numpy()
-    similarities = (text_embedding @ emb.T).squeeze(0)
-    indices = similarities.argsort()[::-1][:limit]
-    
-    return [paths[i] for i in indices]
+    return _rank(_clip_text_emb(query), emb, paths, limit)
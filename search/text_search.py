@@ -1,23 +1,91 @@
 """Text/document search functionality - Search within document contents"""
 import os
 import sqlite3
+from functools import lru_cache
 import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
-from config import TEXT_EMBEDDINGS_DB, TEXT_SEARCH_MODEL
+from config import TEXT_EMBEDDINGS_DB, TEXT_SEARCH_MODEL, TEXT_EMBEDDING_DIM
+from utils.helpers import embeddings_from_blobs
 
 # Initialize model )
-model = SentenceTransformer(TEXT_SEARCH_MODEL)
+model = SentenceTransformer(TEXT_SEARCH_MODEL, device="cuda" if torch.cuda.is_available() else "cpu")
 
+@lru_cache(maxsize=1024)
 def embed_text(text):
-    """Generate embedding for the given text using the sentence transformer model
+    """Generate embedding for the given text using the sentence transformer model.
+    Results are cached, repeated queries skip the forward pass.
     param text: str - input text to embed
-    return: np.ndarray - embedding vector"""
+    return: np.ndarray - embedding vector (read-only, shared through the cache)"""
 
-    emb = model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
-    return emb.astype(np.float32)
+    emb = model.encode(text, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+    emb.flags.writeable = False
+    return emb
 
 
 
+# Stacked, normalized embeddings keyed on the DB modification time.
+# Rows are ordered by file, so file i owns rows starts[i]:starts[i + 1]; ids[row] is the row's
+# primary key, chunk text stays in the DB and is only read for the hits
+_text_emb_cache = {"mtime": None, "M": None, "paths": [], "starts": None, "ids": None}
+
+
+def _db_mtime() -> float:
+    """Last modification time of the embeddings DB, including its WAL file"""
+    candidates = (TEXT_EMBEDDINGS_DB, TEXT_EMBEDDINGS_DB + "-wal")
+    return max((os.path.getmtime(p) for p in candidates if os.path.exists(p)), default=0.0)
+
+
+def _load_matrix():
+    """Return the cached (N, dim) embedding matrix, rebuilding it when the DB has changed"""
+    mtime = _db_mtime()
+    if _text_emb_cache["mtime"] == mtime and _text_emb_cache["M"] is not None:
+        return _text_emb_cache
+
+    conn = sqlite3.connect(TEXT_EMBEDDINGS_DB)
+    try:
+        rows = conn.execute(
+            "SELECT file_path, embedding, id FROM embeddings ORDER BY file_path, chunk_index"
+        ).fetchall()
+    finally:
+        conn.close()
+
+    M = embeddings_from_blobs([row[1] for row in rows], TEXT_EMBEDDING_DIM)
+    norms = np.linalg.norm(M, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    M /= norms
+
+    paths = []
+    starts = []
+    for i, row in enumerate(rows):
+        if not paths or row[0] != paths[-1]:
+            paths.append(row[0])
+            starts.append(i)
+
+    _text_emb_cache.update(
+        mtime=mtime,
+        M=M,
+        paths=paths,
+        starts=np.array(starts, dtype=np.intp),
+        ids=np.fromiter((row[2] for row in rows), dtype=np.int64, count=len(rows)),
+    )
+    return _text_emb_cache
+
+
+def _fetch_snippets(row_ids: list) -> dict:
+    """First 101 characters of each chunk's content by row id, enough to tell whether it needs a trailing ellipsis"""
+    if not row_ids:
+        return {}
+    conn = sqlite3.connect(TEXT_EMBEDDINGS_DB)
+    try:
+        placeholders = ",".join("?" * len(row_ids))
+        return dict(conn.execute(
+            f"SELECT id, substr(content, 1, 101) FROM embeddings WHERE id IN ({placeholders})", row_ids
+        ).fetchall())
+    finally:
+        conn.close()
+
+
 def search_text_content(query: str, limit: int = 50):
     """
     Search for documents containing the query text.
@@ -30,51 +98,47 @@ def search_text_content(query: str, limit: int = 50):
         List of dicts with file info and matching snippets
     """
     try:
+        cache = _load_matrix()
+        M = cache["M"]
+        if not len(M):
+            return []
+
         query_emb = embed_text(query)
-        conn = sqlite3.connect(TEXT_EMBEDDINGS_DB)
-        cur = conn.cursor()
+        scores = M @ query_emb
 
-        cur.execute("SELECT file_path, embedding, content FROM embeddings")
-        rows = cur.fetchall()
-        conn.close()
+        # Best chunk score per file in one pass over the contiguous per-file row ranges
+        starts = cache["starts"]
+        best = np.maximum.reduceat(scores, starts)
 
-        if not rows:
+        # Partial top-K over files, only the K winners get sorted
+        k = min(limit, len(best))
+        if k <= 0:
             return []
+        top = np.argpartition(-best, k - 1)[:k]
+        top = top[np.argsort(-best[top], kind="stable")]
 
-        scores = []
-        for file_path, emb_blob, content in rows:
-            emb = np.frombuffer(emb_blob, dtype=np.float32)
-            score = cosine_similarity(query_emb, emb)
-            scores.append((file_path, score, content))
-
-        # Sort by similarity, filter unique files with best score
-        file_best_scores = {}
-        for file_path, score, content in scores:
-            if file_path not in file_best_scores or score > file_best_scores[file_path][0]:
-                file_best_scores[file_path] = (score, content)
-
-        # Convert to list format expected by frontend
+        paths, ids = cache["paths"], cache["ids"]
+        ends = np.append(starts[1:], len(scores))
+        # The winning chunk of each file supplies the snippet
+        best_ids = [int(ids[starts[f] + int(np.argmax(scores[starts[f]:ends[f]]))]) for f in top.tolist()]
+        snippets = _fetch_snippets(best_ids)
         results = []
-        for file_path, (score, content) in sorted(file_best_scores.items(), key=lambda x: x[1][0], reverse=True)[:limit]:
+        for f, row_id in zip(top.tolist(), best_ids):
+            file_path = paths[f]
+            content = snippets.get(row_id) or ""
             # Extract the text snippet related to the query
             snippet = content[:100] + "..." if len(content) > 100 else content
-            
+            ext = os.path.splitext(file_path)[1]
+
             results.append({
                 "name": os.path.basename(file_path),
                 "path": file_path,
-                "type": os.path.splitext(file_path)[1][1:].upper() if os.path.splitext(file_path)[1] else "FILE",
+                "type": ext[1:].upper() if ext else "FILE",
                 "snippet": snippet,
-                "score": float(score)
+                "score": float(best[f])
             })
 
         return results
     except Exception as e:
         print(f"Error searching documents: {e}")
         return []
-    
-def cosine_similarity(a, b):
-    """Calculate cosine similarity between two vectors.
-    param a: np.ndarray - first vector"""
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-
-
@@ -1,4 +1,4 @@
 """Utils package - Shared utility functions"""
-from .helpers import timeit, is_hidden, is_accessible, check_letters, get_value, clean_query
+from .helpers import timeit, is_hidden, is_accessible, is_hidden_entry, is_accessible_entry, check_letters, has_skip_pattern, get_value, name_to_keys, name_to_key, clean_query, quantize_embedding, embedding_from_blob, embeddings_from_blobs, json_dumps, json_loads, write_json_atomic, scan_files, scan_file_entries
 
-__all__ = ['timeit', 'is_hidden', 'is_accessible', 'check_letters', 'get_value', 'clean_query']
+__all__ = ['timeit', 'is_hidden', 'is_accessible', 'is_hidden_entry', 'is_accessible_entry', 'check_letters', 'has_skip_pattern', 'get_value', 'name_to_keys', 'name_to_key', 'clean_query', 'quantize_embedding', 'embedding_from_blob', 'embeddings_from_blobs', 'json_dumps', 'json_loads', 'write_json_atomic', 'scan_files', 'scan_file_entries']
@@ -0,0 +1,92 @@
+"""SQLite connection helpers shared by the indexers"""
+import sqlite3
+
+
+def open_bulk(path: str) -> sqlite3.Connection:
+    """
+    Open a connection tuned for bulk loading: WAL, relaxed fsync, large page cache, temp tables in memory.
+    The database isn't locked exclusively, the search UI keeps reading while an index is built.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-262144")  # 256 MB page cache
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=1073741824")  # 1 GB
+    return conn
+
+
+# Secondary indexes of the file search table, by name
+FILE_SEARCH_INDEXES = {
+    "idx_files_prefix": "CREATE INDEX IF NOT EXISTS idx_files_prefix ON files(prefix)",
+    "idx_files_category": "CREATE INDEX IF NOT EXISTS idx_files_category ON files(file_category, prefix)",
+    "idx_files_extension": "CREATE INDEX IF NOT EXISTS idx_files_extension ON files(file_extension, prefix)",
+}
+
+
+def ensure_file_search_schema(conn: sqlite3.Connection) -> None:
+    """
+    Create the file search table (one row per file) and its indexes.
+    Older layouts are converted in place: one row per name holding a JSON array of files
+    (file_index), and one row per file holding a JSON object (files.data).
+    """
+    from itertools import islice
+    from utils.helpers import json_loads
+
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+    json_rows = "data" in columns
+    if json_rows:
+        conn.execute("ALTER TABLE files RENAME TO files_json_rows")
+
+    # NOCASE on prefix lets SQLite answer `prefix LIKE 'abc%'` with an index range scan.
+    # Plain columns, so a search returns ready tuples with no JSON decoding
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY,
+            prefix TEXT NOT NULL COLLATE NOCASE,
+            file_extension TEXT NOT NULL,
+            file_category TEXT NOT NULL,
+            file_name TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_type TEXT
+        )
+    """)
+
+    if json_rows:
+        print("Converting file search index to the column layout...")
+        with conn:
+            conn.execute("""
+                INSERT INTO files (prefix, file_extension, file_category, file_name, file_path, file_type)
+                SELECT prefix, file_extension, file_category,
+                       json_extract(data, '$.file_name'), json_extract(data, '$.file_path'), json_extract(data, '$.file_type')
+                FROM files_json_rows
+            """)
+            conn.execute("DROP TABLE files_json_rows")
+
+    for sql in FILE_SEARCH_INDEXES.values():
+        conn.execute(sql)
+    conn.commit()
+
+    legacy = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'file_index'").fetchone()
+    if legacy is None:
+        return
+
+    def legacy_rows():
+        for prefix, extension, category, files_json in conn.execute(
+                "SELECT prefix, file_extension, file_category, files_json FROM file_index"):
+            for item in json_loads(files_json):
+                # json_insert used to append whole arrays, so items may be nested one level
+                for file_dict in (item if isinstance(item, list) else [item]):
+                    if isinstance(file_dict, dict):
+                        yield (prefix, extension, category,
+                               file_dict["file_name"], file_dict["file_path"], file_dict.get("file_type"))
+
+    print("Converting file search index to the one-row-per-file layout...")
+    rows = legacy_rows()
+    with conn:
+        while batch := list(islice(rows, 10000)):
+            conn.executemany(
+                "INSERT INTO files (prefix, file_extension, file_category, file_name, file_path, file_type) VALUES (?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+        conn.execute("DROP TABLE file_index")
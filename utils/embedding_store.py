@@ -0,0 +1,108 @@
+"""Contiguous on-disk copy of the image embeddings, memory-mapped at search time.
+SQLite stays the source of truth (auto_index writes single rows there); the store is
+rebuilt from it whenever the database is newer.
+
+Invariant: every writer L2-normalizes embeddings before storing them, so nothing
+here renormalizes on load.
+"""
+import os
+import sqlite3
+import numpy as np
+from config import IMAGE_EMBEDDINGS_DB, IMAGE_EMBEDDINGS_STORE, IMAGE_PATHS_STORE, IMAGE_EMBEDDING_DIM
+from config import IMAGE_ANN_INDEX, ANN_MIN_IMAGES
+from utils.helpers import embeddings_from_blobs, json_dumps, json_loads
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+
+def _db_mtime() -> float:
+    """Last modification time of the embeddings DB, including its WAL file"""
+    candidates = (IMAGE_EMBEDDINGS_DB, IMAGE_EMBEDDINGS_DB + "-wal")
+    return max((os.path.getmtime(p) for p in candidates if os.path.exists(p)), default=0.0)
+
+
+def is_store_fresh() -> bool:
+    """True if the memory-mapped store reflects the current database contents"""
+    if not (os.path.exists(IMAGE_EMBEDDINGS_STORE) and os.path.exists(IMAGE_PATHS_STORE)):
+        return False
+    store_mtime = min(os.path.getmtime(IMAGE_EMBEDDINGS_STORE), os.path.getmtime(IMAGE_PATHS_STORE))
+    return store_mtime >= _db_mtime()
+
+
+def open_store():
+    """
+    Memory-map the stored embeddings.
+    return: (np.memmap of shape [N, dim], list of image paths)
+    """
+    with open(IMAGE_PATHS_STORE, "rb") as f:
+        meta = json_loads(f.read())
+    embeddings = np.memmap(IMAGE_EMBEDDINGS_STORE, dtype=np.float32, mode="r").reshape(-1, meta["dim"])
+    return embeddings, meta["paths"]
+
+
+def rebuild_store():
+    """
+    Read every embedding from SQLite and write the contiguous store.
+    return: (np.ndarray of shape [N, dim], list of image paths), or (None, None) if the DB is empty
+    """
+    conn = sqlite3.connect(IMAGE_EMBEDDINGS_DB)
+    rows = conn.execute("SELECT path, embedding FROM embeddings").fetchall()
+    conn.close()
+
+    if not rows:
+        return None, None
+
+    paths = [row[0] for row in rows]
+    # SQLite keeps int8 BLOBs (older rows float16/float32); the search copy is float32 so the similarity matmul stays on BLAS sgemm
+    embeddings = embeddings_from_blobs([row[1] for row in rows], IMAGE_EMBEDDING_DIM)
+    # Stripped under python -O; catches a writer that forgot to normalize (tolerance covers float16 rounding)
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-2), "image embeddings must be L2-normalized"
+
+    try:
+        tmp_store = IMAGE_EMBEDDINGS_STORE + ".tmp"
+        tmp_paths = IMAGE_PATHS_STORE + ".tmp"
+        embeddings.tofile(tmp_store)
+        with open(tmp_paths, "w", encoding="utf-8") as f:
+            f.write(json_dumps({"dim": embeddings.shape[1], "paths": paths}))
+        os.replace(tmp_store, IMAGE_EMBEDDINGS_STORE)
+        os.replace(tmp_paths, IMAGE_PATHS_STORE)
+    except OSError as e:
+        # e.g. the old store is still mapped by a search on Windows; the DB copy is still valid
+        print(f"Could not write embeddings store: {e}")
+
+    build_ann_index(embeddings)
+    return embeddings, paths
+
+
+def build_ann_index(embeddings):
+    """
+    Build and persist an HNSW inner-product index for large libraries.
+    Skipped when faiss is missing or the library is small enough for brute force.
+    """
+    if not FAISS_AVAILABLE or len(embeddings) < ANN_MIN_IMAGES:
+        return
+    print(f"Building ANN index over {len(embeddings)} image embeddings...")
+    index = faiss.IndexHNSWFlat(embeddings.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+    index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+    try:
+        tmp_index = IMAGE_ANN_INDEX + ".tmp"
+        faiss.write_index(index, tmp_index)
+        os.replace(tmp_index, IMAGE_ANN_INDEX)
+    except (OSError, RuntimeError) as e:
+        print(f"Could not write ANN index: {e}")
+
+
+def open_ann_index():
+    """
+    Load the persisted ANN index if it is present and up to date with the DB.
+    return: faiss index, or None to fall back to brute force search
+    """
+    if not FAISS_AVAILABLE or not os.path.exists(IMAGE_ANN_INDEX):
+        return None
+    if os.path.getmtime(IMAGE_ANN_INDEX) < _db_mtime():
+        return None
+    return faiss.read_index(IMAGE_ANN_INDEX)
@@ -1,10 +1,18 @@
 """Shared utility functions"""
 import os
+import re
 import string
 import time
 from functools import wraps
-from config import SYMBOL_MAP, DIGIT_MAP, VALID_SYMBOLS, VALID_IMAGE_EXTENSIONS
+from config import SYMBOL_MAP, DIGIT_MAP, VALID_SYMBOLS, VALID_IMAGE_EXTENSIONS, SKIP_PATTERNS, TIMEIT_ENABLED
 import json
+import numpy as np
+
+try:
+    import orjson  # several times faster than stdlib json on the file search rows
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 if os.name == 'nt':
     import ctypes
@@ -15,7 +23,11 @@ if os.name == 'nt':
 def timeit(func):
     """Decorator to measure execution time of a function.
         was made to help debug performance issues.
+        Returns func unchanged unless SMARTSEARCH_TIMEIT is set, so it costs nothing in normal runs.
     """
+    if not TIMEIT_ENABLED:
+        return func
+
     @wraps(func)
     def wrapper(*args, **kwargs):
         start = time.perf_counter()
@@ -53,12 +65,47 @@ def is_accessible(path: str) -> bool:
     return os.access(path, os.R_OK)
 
 
+def is_hidden_entry(entry: os.DirEntry) -> bool:
+    """is_hidden for a scandir entry, using the attributes the directory listing already returned
+    params: entry: os.DirEntry - entry from os.scandir
+    return: bool - True if hidden/system, False otherwise
+    """
+    if os.name == 'nt':
+        try:
+            # Cached by scandir on Windows, no extra GetFileAttributesW call
+            attrs = entry.stat(follow_symlinks=False).st_file_attributes
+            return bool(attrs & (FILE_ATTRIBUTE_HIDDEN | FILE_ATTRIBUTE_SYSTEM))
+        except OSError:
+            return False
+    return entry.name.startswith('.')
+
+
+def is_accessible_entry(entry: os.DirEntry) -> bool:
+    """is_accessible for a scandir entry, reusing its cached file type
+    params: entry: os.DirEntry - entry from os.scandir
+    return: bool - True if accessible, False otherwise
+    """
+    if os.name == 'nt':
+        # os.access on Windows only re-checks that the path exists (ACLs are ignored), which a fresh
+        # listing already proves; unreadable folders surface as an OSError when they are scanned
+        return True
+    try:
+        if entry.is_dir():
+            return os.access(entry.path, os.R_OK | os.X_OK)
+    except OSError:
+        return False
+    return os.access(entry.path, os.R_OK)
+
+
+# Built once at import instead of on every check_letters/clean_query call
+_ALLOWED_CHARS = frozenset(string.ascii_letters + string.digits).union(VALID_SYMBOLS)
+
+
 def check_letters(s: str) -> bool:
     """Return True if all characters are allowed based on the valid symbols in config and letters and digits.
     param s: str - input string
     return: bool - True if all characters are allowed, False otherwise"""
-    ALLOWED = set(string.ascii_letters + string.digits).union(VALID_SYMBOLS)
-    return all(ch in ALLOWED for ch in s)
+    return _ALLOWED_CHARS.issuperset(s)
 
 
 def get_value(ch: str) -> str:
@@ -77,10 +124,172 @@ def get_value(ch: str) -> str:
         raise ValueError(f"Unsupported character: {ch!r}")
 
 
+# get_value for every ASCII character it accepts, so whole names are mapped by str.translate in C
+_KEY_TABLE = {ord(ch): get_value(ch) for ch in string.ascii_letters + string.digits + ''.join(SYMBOL_MAP)}
+
+
+_KEY_BY_CHAR = {chr(code): key for code, key in _KEY_TABLE.items()}
+
+
+def name_to_keys(name: str) -> list:
+    """Lowercase name and map each character through get_value, giving the tree path for it.
+    param name: str - file name or query
+    return: list - one tree key per character
+    """
+    lowered = name.lower()
+    try:
+        return list(map(_KEY_BY_CHAR.__getitem__, lowered))
+    except KeyError:
+        # Non-ASCII letters, or an unsupported character get_value raises for
+        return [get_value(ch) for ch in lowered]
+
+
+def name_to_key(name: str) -> str:
+    """Lowercase name and map every character through get_value, giving the file index prefix key.
+    param name: str - file name or query
+    return: str - prefix key
+    """
+    key = name.lower().translate(_KEY_TABLE)
+    # Every mapped value is ASCII alphanumeric, so anything else was left unmapped;
+    # the per-character path handles non-ASCII letters and raises for unsupported characters
+    if key.isascii() and key.isalnum():
+        return key
+    return ''.join(get_value(ch) for ch in name.lower())
+
+
+def quantize_embedding(embedding: np.ndarray) -> bytes:
+    """Encode an embedding as int8 with a per-vector scale: a float32 scale followed by dim int8 values.
+    param embedding: np.ndarray - 1D embedding
+    return: bytes - BLOB of dim + 4 bytes
+    """
+    embedding = np.asarray(embedding, dtype=np.float32).ravel()
+    scale = np.float32(np.abs(embedding).max() or 1.0)
+    q = np.clip(np.round(embedding / scale * 127), -127, 127).astype(np.int8)
+    return scale.tobytes() + q.tobytes()
+
+
+def embedding_from_blob(blob: bytes, dim: int) -> np.ndarray:
+    """Decode a stored embedding BLOB as float32.
+    The byte length tells the formats apart, so databases with rows of mixed ages need no migration:
+    dim + 4 is int8 with a scale (image rows), dim * 2 is float16, dim * 4 is legacy float32.
+    """
+    if len(blob) == dim + 4:
+        scale = np.frombuffer(blob, dtype=np.float32, count=1)[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=4).astype(np.float32) * (scale / 127)
+    dtype = np.float16 if len(blob) == dim * 2 else np.float32
+    return np.frombuffer(blob, dtype=dtype).astype(np.float32)
+
+
+def embeddings_from_blobs(blobs: list, dim: int) -> np.ndarray:
+    """Decode many embedding BLOBs into one (N, dim) float32 matrix.
+    When every BLOB has the same format they are joined and decoded in a single pass,
+    otherwise rows are decoded one by one straight into the preallocated matrix.
+    """
+    sizes = set(map(len, blobs))
+    if len(sizes) == 1:
+        size = sizes.pop()
+        raw = np.frombuffer(b"".join(blobs), dtype=np.uint8).reshape(len(blobs), size)
+        if size == dim + 4:
+            scales = raw[:, :4].copy().view(np.float32)
+            return raw[:, 4:].view(np.int8).astype(np.float32) * (scales / 127)
+        dtype = np.float16 if size == dim * 2 else np.float32
+        return raw.view(dtype).astype(np.float32)
+    out = np.empty((len(blobs), dim), dtype=np.float32)
+    for i, blob in enumerate(blobs):
+        out[i] = embedding_from_blob(blob, dim)
+    return out
+
+
+# Runs of disallowed characters, stripped from queries in one C-level pass
+_DISALLOWED_RE = re.compile("[^" + "".join(map(re.escape, sorted(_ALLOWED_CHARS))) + "]+")
+
+
 def clean_query(s: str) -> str:
     """Keep only allowed characters."""
-    ALLOWED = set(string.ascii_letters + string.digits).union(VALID_SYMBOLS)
-    return "".join(ch for ch in (s or "") if ch in ALLOWED).lower()
+    return _DISALLOWED_RE.sub("", s or "").lower()
+
+
+def json_dumps(data) -> str:
+    """Serialize to a compact JSON string, with orjson when it's installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data).decode()
+    return json.dumps(data)
+
+
+def json_loads(data):
+    """Parse JSON from str or bytes, with orjson when it's installed (raises json.JSONDecodeError either way)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def write_json_atomic(path: str, data, **kwargs) -> None:
+    """Write JSON to a temp file and swap it in, so a crash never leaves a truncated file behind"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    # json.dump writes many small chunks, a large buffer turns them into few write calls
+    with open(tmp_path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp_path, path)
+
+
+# All skip patterns in one alternation, a single scan of the name instead of one `in` per pattern
+_SKIP_RE = re.compile("|".join(map(re.escape, SKIP_PATTERNS)))
+
+
+def has_skip_pattern(name_lower: str) -> bool:
+    """True if the (already lowercased) name or path contains any of SKIP_PATTERNS"""
+    return _SKIP_RE.search(name_lower) is not None
+
+
+def _walk_files(root: str, extensions) -> list:
+    """Walk root once with scandir, collecting (dirpath, DirEntry) pairs for files with one of the given extensions.
+    Entries are kept so callers can reuse their cached stat data (free on Windows)."""
+    found = []
+    pending = [root]
+    while pending:
+        dirpath = pending.pop()
+        try:
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                            continue
+                    except OSError:
+                        continue
+                    name = entry.name
+                    # Same result as splitext for normal names, without building the stem string
+                    dot = name.rfind('.')
+                    if dot > 0 and name[dot:].lower() in extensions:
+                        found.append((dirpath, entry))
+        except OSError:
+            continue
+    return found
+
+
+def scan_file_entries(roots: list, extensions) -> list:
+    """Return (dirpath, DirEntry) pairs for files under roots with one of the given extensions.
+    Nothing is kept between calls, so a scan always sees the current tree.
+    params: roots: list - directories to scan
+            extensions: iterable of lowercase extensions including the dot
+    return: list of (dirpath, os.DirEntry) tuples
+    """
+    extensions = frozenset(extensions)
+    found = []
+    for root in roots:
+        if os.path.isdir(root):
+            found.extend(_walk_files(root, extensions))
+    return found
+
+
+def scan_files(roots: list, extensions) -> list:
+    """Return (dirpath, name) pairs for files under roots with one of the given extensions (see scan_file_entries).
+    params: roots: list - directories to scan
+            extensions: iterable of lowercase extensions including the dot
+    return: list of (dirpath, name) tuples
+    """
+    return [(dirpath, entry.name) for dirpath, entry in scan_file_entries(roots, extensions)]
 
 
 def find_media(directories: list):
@@ -89,27 +298,36 @@ def find_media(directories: list):
     :param directories:
     :return Valid image directories:
     """
-    from config import SKIP_PATTERNS, FILE_DATA_JSON
+    from config import FILE_DATA_JSON, FILE_DATA_JOURNAL
     
-    valid_images = []
-    for directories in directories:
-        for root, _, files in os.walk(directories):
-            if is_hidden(root):
-                continue
-            
+    hidden_dirs = {}
+    valid_images = {}  # dict keeps discovery order and dedupes overlapping roots
+    for root, entry in scan_file_entries(directories, VALID_IMAGE_EXTENSIONS):
+        if root not in hidden_dirs:
             # Skip paths containing skip patterns
             root_lower = root.lower()
-            if any(pattern in root_lower for pattern in SKIP_PATTERNS):
+            hidden_dirs[root] = (is_hidden(root) or has_skip_pattern(root_lower)
+                                 or 'windows' in root_lower or 'xampp' in root_lower)
+        if hidden_dirs[root]:
+            continue
+        
+        file = entry.name
+        file_path = entry.path
+        if len(file) > 3 and file_path not in valid_images:
+            file_lower = file.lower()
+            if 'windows' in file_lower or 'xampp' in file_lower:
+                continue
+            try:
+                # Size from the scandir entry: no second stat on Windows, where the listing carries it
+                if entry.stat().st_size > 10 * 1024:  # Ignore small files
+                    valid_images[file_path] = ""
+            except OSError:
                 continue
-            
-            for file in files:
-                file_path = os.path.join(root, file)
-                ext = os.path.splitext(file)[1].lower()
-
-                if ext in VALID_IMAGE_EXTENSIONS and os.path.getsize(file_path) > 10 * 1024 and 'windows' not in file_path.lower() and 'xampp' not in file_path.lower() and len(file) > 3 and file_path not in valid_images:  # Ignore small files
-                    valid_images.append(file_path)
-        json_data = {path:"" for path in valid_images}
-        with open(FILE_DATA_JSON, 'w') as data:
-            json.dump(json_data, data)
+    # Already the {path: ""} mapping the file stores; json.dump streams it out in chunks
+    write_json_atomic(FILE_DATA_JSON, valid_images)
+    valid_images = list(valid_images)
+    # Full rewrite supersedes anything auto_index journaled
+    if os.path.exists(FILE_DATA_JOURNAL):
+        os.remove(FILE_DATA_JOURNAL)
 
     return valid_images
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""Image loading for batched CLIP indexing - kept free of model imports so DataLoader workers start fast"""
+import os
+import hashlib
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from torchvision import transforms
+from PIL import Image
+from config import PREPROC_CACHE_DIR, CACHE_PREPROCESSED_IMAGES, PREPROC_CACHE_MAX_MB
+
+try:
+    from torchvision.io import decode_jpeg, read_file, ImageReadMode
+    from torchvision.transforms import v2
+    GPU_DECODE_AVAILABLE = True
+except ImportError:
+    GPU_DECODE_AVAILABLE = False
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+# Same pipeline as clip.load()'s preprocess, applied to uint8 tensors already on the GPU
+if GPU_DECODE_AVAILABLE:
+    _gpu_transform = v2.Compose([
+        v2.Resize(224, interpolation=v2.InterpolationMode.BICUBIC, antialias=True),
+        v2.CenterCrop(224),
+        v2.ToDtype(torch.float32, scale=True),
+        v2.Normalize((0.48145466, 0.4578275, 0.40821073), (0.26862954, 0.26130258, 0.27577711)),
+    ])
+
+
+def _open_image(path: str) -> Image.Image:
+    """Open an image, letting libjpeg decode large JPEGs at a reduced scale (still at least 2x the model input)"""
+    image = Image.open(path)
+    image.draft("RGB", (448, 448))
+    return image
+
+
+def _cache_path(path: str) -> str:
+    """Cache file for an image; keyed on the path alone so re-indexing an edited file overwrites its entry"""
+    key = hashlib.sha1(f"thumb|{path}".encode("utf-8")).hexdigest()
+    return os.path.join(PREPROC_CACHE_DIR, f"{key}.npz")
+
+
+def cache_preprocessed(path: str, preprocess) -> torch.Tensor:
+    """Return preprocess(image), reusing a cached thumbnail when the file is unchanged.
+    The cache holds the resized, cropped RGB image as uint8 (the output of the expensive PIL steps),
+    so a hit only runs ToTensor + Normalize. Each entry stores the file's mtime and size, so edited files are decoded again.
+    param path: str - image file path
+    param preprocess: CLIP preprocessing transform
+    return: torch.Tensor - preprocessed image of shape [3, 224, 224]
+    """
+    if not CACHE_PREPROCESSED_IMAGES:
+        return preprocess(_open_image(path).convert("RGB"))
+
+    # CLIP's preprocess is Compose([Resize, CenterCrop, to_rgb, ToTensor, Normalize])
+    pil_steps = transforms.Compose(preprocess.transforms[:3])
+    tensor_steps = transforms.Compose(preprocess.transforms[3:])
+
+    st = os.stat(path)
+    stamp = np.array([st.st_mtime_ns, st.st_size], dtype=np.int64)
+    cache_path = _cache_path(path)
+
+    try:
+        with np.load(cache_path) as cached:
+            if np.array_equal(cached["stamp"], stamp):
+                thumbnail = cached["thumb"]
+                os.utime(cache_path)  # mtime doubles as last-used time for prune_preprocessed_cache
+                return tensor_steps(thumbnail)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    thumbnail = np.asarray(pil_steps(_open_image(path)), dtype=np.uint8)  # [224, 224, 3]
+    try:
+        os.makedirs(PREPROC_CACHE_DIR, exist_ok=True)
+        np.savez(cache_path, thumb=thumbnail, stamp=stamp)
+    except OSError as e:
+        print(f"Could not cache preprocessed image {path}: {e}")
+    return tensor_steps(thumbnail)
+
+
+def prune_preprocessed_cache(keep_paths) -> None:
+    """Drop cached thumbnails for images no longer indexed, then evict the least recently used
+    entries until the cache fits in PREPROC_CACHE_MAX_MB.
+    param keep_paths: iterable of image paths that are still indexed
+    """
+    if not os.path.isdir(PREPROC_CACHE_DIR):
+        return
+    keep = {os.path.basename(_cache_path(p)) for p in keep_paths}
+    entries = []
+    with os.scandir(PREPROC_CACHE_DIR) as it:
+        for entry in it:
+            try:
+                if entry.name not in keep:
+                    os.remove(entry.path)  # orphans, and .npy files from the old path+mtime keyed layout
+                    continue
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+            except OSError:
+                continue
+
+    budget = PREPROC_CACHE_MAX_MB * 1024 * 1024
+    total = sum(size for _, size, _ in entries)
+    entries.sort()
+    for _, size, cache_path in entries:
+        if total <= budget:
+            break
+        try:
+            os.remove(cache_path)
+            total -= size
+        except OSError:
+            continue
+
+
+def preprocess_on_device(path: str, preprocess, device: str) -> torch.Tensor:
+    """Preprocess a single image straight onto device.
+    JPEGs are decoded by nvJPEG and transformed on the GPU when running on CUDA,
+    anything else goes through the cached CPU path.
+    return: torch.Tensor - preprocessed image of shape [3, 224, 224] on device
+    """
+    if GPU_DECODE_AVAILABLE and device == "cuda" and path.lower().endswith(JPEG_EXTENSIONS):
+        try:
+            image = decode_jpeg(read_file(path), mode=ImageReadMode.RGB, device=device)
+            return _gpu_transform(image)
+        except RuntimeError:
+            pass  # progressive/CMYK JPEGs nvJPEG can't handle, fall back to PIL
+    return cache_preprocessed(path, preprocess).to(device)
+
+
+class ImageDataset(Dataset):
+    """Decodes and preprocesses images on DataLoader worker processes"""
+
+    def __init__(self, paths, preprocess):
+        self.paths = paths
+        self.preprocess = preprocess
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, idx):
+        path = self.paths[idx]
+        try:
+            return cache_preprocessed(path, self.preprocess), path
+        except Exception as e:
+            print(f"Skipping unreadable image {path}: {e}")
+            return None
+
+
+def collate_images(samples):
+    """Stack the readable samples of a batch, dropping files that failed to load"""
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        return None, []
+    tensors, paths = zip(*samples)
+    return torch.stack(tensors), list(paths)